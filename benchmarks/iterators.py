@@ -0,0 +1,97 @@
+from containers import HashTable, OpenHashTable
+from timeit import timeit
+
+
+# Compares iterating a hash table with the generator-based iterators against the class-based iterators the
+# HashTable used to have, which are reproduced below. Run from the repository root with
+# python -m benchmarks.iterators
+
+
+class LegacyHashTableIterator(object):
+    # The HashTableIterator class as it was before the generator-based iterators replaced it. O(1) to initialize.
+    def __init__(self, hash_table):
+        self.outer = 0
+        self.inner = 0
+        self.ht = hash_table
+
+    # Conforms to iterator protocol. Runs in O(1)
+    def __iter__(self):
+        return self
+
+    # Steps through the buckets and the pairs in each bucket one call at a time. O(1) amortized.
+    def __next__(self):
+        while self.outer < len(self.ht.array):
+            while self.inner < len(self.ht.array[self.outer]):
+                next_kvp = self.ht.array[self.outer][self.inner]
+                self.inner += 1
+                return next_kvp
+            self.outer += 1
+            self.inner = 0
+        raise StopIteration
+
+
+class LegacyHashKeyIterator(object):
+    # The HashKeyIterator class as it was before the generator-based iterators replaced it. O(1) to initialize.
+    def __init__(self, hash_table):
+        self.iterator = LegacyHashTableIterator(hash_table)
+
+    # Conforms to iterator protocol. Runs in O(1)
+    def __iter__(self):
+        return self
+
+    # Returns the key from the pair returned by the legacy iterator. O(1)
+    def __next__(self):
+        return self.iterator.__next__()[0]
+
+
+class LegacyHashValueIterator(object):
+    # The HashValueIterator class as it was before the generator-based iterators replaced it. O(1) to initialize.
+    def __init__(self, hash_table):
+        self.iterator = LegacyHashTableIterator(hash_table)
+
+    # Conforms to iterator protocol. Runs in O(1)
+    def __iter__(self):
+        return self
+
+    # Returns the value from the pair returned by the legacy iterator. O(1)
+    def __next__(self):
+        return self.iterator.__next__()[1]
+
+
+# Times one complete pass over the iterator returned by make_iterator, repeated the given number of times, and
+# returns the best time per pass in seconds. O(n) per pass.
+def time_pass(make_iterator, repeat):
+    best = None
+    for _ in range(repeat):
+        elapsed = timeit(lambda: exhaust(make_iterator()), number=1)
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+
+# Consumes an iterator without keeping its elements. O(n)
+def exhaust(iterator):
+    for _ in iterator:
+        pass
+
+
+# Prints the time per pass of each kind of iteration for tables of several sizes. O(n) per pass.
+def main(sizes=(1000, 100000, 1000000), repeat=5):
+    print("Entries    | Iteration | Legacy (ms) | HashTable (ms) | OpenHashTable (ms)")
+    for size in sizes:
+        table = HashTable.from_pairs([(i, i) for i in range(size)], size)
+        open_table = OpenHashTable.from_pairs([(i, i) for i in range(size)], size)
+        cases = [("items", LegacyHashTableIterator, iter, iter),
+                 ("keys", LegacyHashKeyIterator, HashTable.key_iterator, OpenHashTable.key_iterator),
+                 ("values", LegacyHashValueIterator, HashTable.value_iterator, OpenHashTable.value_iterator)]
+        for name, legacy, current, current_open in cases:
+            legacy_time = time_pass(lambda: legacy(table), repeat)
+            current_time = time_pass(lambda: current(table), repeat)
+            open_time = time_pass(lambda: current_open(open_table), repeat)
+            print(str(size).rjust(10) + " | " + name.ljust(9) + " | " + ("%.2f" % (legacy_time * 1000)).rjust(11) +
+                  " | " + ("%.2f" % (current_time * 1000)).rjust(14) + " | " +
+                  ("%.2f" % (open_time * 1000)).rjust(18))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,173 @@
+from containers import using_table_type, HashTable, OpenHashTable
+from reporting import json_object
+from wgups import setup_simulator
+from datetime import time
+from time import perf_counter
+import argparse
+import os
+import platform
+import random
+import subprocess
+import tempfile
+
+
+# Measures how the simulator scales by generating synthetic location networks and package manifests of any size
+# and timing each stage of a simulated day on them. The manifests include deadlines, truck 2 only packages,
+# delayed packages, and groups of packages which must be delivered together, in roughly the same proportions as
+# the real package file. Results are written as a JSON file so that runs before and after a change can be
+# compared. Run from the repository root, for example
+# python -m benchmarks.scaling --sizes 100 1000 10000 --output results.json
+
+
+# Deadlines given to packages which are not due at the end of the day.
+DEADLINES = ["9:00 AM", "10:30 AM"]
+
+
+# Writes a locations csv file with the given number of locations placed at random in a square area, with the hub
+# first. Distances are straight-line distances lengthened by 30% to account for roads, rounded to a tenth of a
+# mile, and only the lower triangle of the table is written, like the real file. O(n^2)
+def generate_locations(file_path, location_count, seed=0, area_miles=12.0):
+    import csv
+    generator = random.Random(seed)
+    points = [(generator.uniform(0, area_miles), generator.uniform(0, area_miles)) for _ in range(location_count)]
+    with open(file_path, "w", newline="") as file:
+        writer = csv.writer(file)
+        for i in range(location_count):
+            row = [str(1000 + i) + " Synthetic Way", "Salt Lake City", "84" + str(100 + i % 100)]
+            for j in range(i + 1):
+                dx = points[i][0] - points[j][0]
+                dy = points[i][1] - points[j][1]
+                row.append("%.1f" % (1.3 * (dx * dx + dy * dy) ** 0.5))
+            writer.writerow(row)
+
+
+# Writes a packages csv file with the given number of packages going to random locations other than the hub.
+# About 30% of packages have an earlier deadline than the end of the day, 5% can only go on truck 2, 5% are
+# delayed until 9:05, and 5% start a group of two to four packages which must be delivered together. Package 9 is
+# never undeliverable, since the synthetic network has no address to correct it to. O(n)
+def generate_packages(file_path, package_count, location_count, seed=0):
+    import csv
+    generator = random.Random(seed)
+    rows = []
+    for package_id in range(1, package_count + 1):
+        location = generator.randint(1, location_count - 1)
+        address = str(1000 + location) + " Synthetic Way"
+        zip_code = "84" + str(100 + location % 100)
+        deadline = generator.choice(DEADLINES) if generator.random() < 0.3 else "EOD"
+        status = "Delayed" if generator.random() < 0.05 else "At Package Hub"
+        notes = "Truck 2 Only" if generator.random() < 0.05 else ""
+        rows.append([str(package_id), address, "Salt Lake City", zip_code, deadline,
+                     str(generator.randint(1, 90)), status, notes])
+    package_id = 1
+    while package_id <= package_count:
+        group_size = generator.randint(2, 4)
+        if generator.random() < 0.05 and package_id + group_size - 1 <= package_count:
+            for member in range(package_id + 1, package_id + group_size):
+                rows[package_id - 1].append(str(member))
+            package_id += group_size
+        else:
+            package_id += 1
+    with open(file_path, "w", newline="") as file:
+        writer = csv.writer(file)
+        for row in rows:
+            writer.writerow(row)
+
+
+# Returns how long the given function takes to run in seconds, along with what it returned. O(1) overhead
+def timed(function):
+    started = perf_counter()
+    result = function()
+    return perf_counter() - started, result
+
+
+# Generates a network and manifest of the given size and returns the time taken by each stage as (name, seconds)
+# pairs. setup_cold reads the csv files and writes the location cache, setup_warm loads the cache, and the other
+# stages run on simulators which were set up separately so that they do not affect each other. The full day is
+# skipped for sizes above run_limit, since its cost grows fastest.
+def benchmark_size(directory, package_count, location_count, seed, options):
+    locations_path = os.path.join(directory, "locations-" + str(location_count) + ".csv")
+    packages_path = os.path.join(directory, "packages-" + str(package_count) + ".csv")
+    if not os.path.exists(locations_path):
+        generate_locations(locations_path, location_count, seed)
+    generate_packages(packages_path, package_count, location_count, seed)
+    # Package files other than the shipped one get no events by default, so the synthetic days are given the
+    # release of the delayed packages.
+    events_path = os.path.join(directory, "events.csv")
+    with open(events_path, "w") as file:
+        file.write("09:05,release\n")
+
+    def setup():
+        return setup_simulator(time(17, 0, 0), options.improve_routes, options.table_type,
+                               truck_count=options.trucks, driver_count=options.drivers,
+                               locations_path=locations_path, packages_path=packages_path,
+                               events_path=events_path, cluster_count=options.clusters)
+
+    stages = []
+    stages.append(("setup_cold", timed(setup)[0]))
+    seconds, simulator = timed(setup)
+    stages.append(("setup_warm", seconds))
+    # The hub is driven directly here rather than through the simulator, so the table class is selected the
+    # same way Simulator.profiled selects it.
+    with using_table_type(options.table_type):
+        stages.append(("sort_packages", timed(simulator.hub.sort_packages)[0]))
+        stages.append(("next_batch", timed(lambda: simulator.hub.next_batch(simulator.trucks[0]))[0]))
+    if package_count <= options.run_limit:
+        simulator = setup()
+        stages.append(("run", timed(simulator.simulate)[0]))
+        stages.append(("run_miles", simulator.mile_tenths_driven() / 10.0))
+    return stages
+
+
+# Returns the current git commit of the repository, or None if it cannot be determined. O(1)
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+# Parses the command line options. O(n) in the number of arguments.
+def parse_arguments(args):
+    parser = argparse.ArgumentParser(description="Time the simulator on synthetic manifests of several sizes.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 300, 1000, 3000],
+                        help="numbers of packages to generate")
+    parser.add_argument("--locations", type=int, default=None,
+                        help="number of locations, by default a quarter of the packages between 27 and 500")
+    parser.add_argument("--trucks", type=int, default=3)
+    parser.add_argument("--drivers", type=int, default=2)
+    parser.add_argument("--clusters", type=int, default=0, help="number of location clusters for fleet mode")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--run-limit", type=int, default=3000,
+                        help="largest number of packages to simulate a full day for")
+    parser.add_argument("--improve-routes", action="store_true")
+    parser.add_argument("--open-addressing", action="store_true", help="use OpenHashTable instead of HashTable")
+    parser.add_argument("--output", default="benchmark_results.json")
+    options = parser.parse_args(args)
+    options.table_type = OpenHashTable if options.open_addressing else HashTable
+    return options
+
+
+# Runs the benchmark for every size, printing each stage as it finishes and writing all results to the output
+# file at the end.
+def main(args=None):
+    options = parse_arguments(args)
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        for package_count in options.sizes:
+            location_count = options.locations or max(27, min(package_count // 4, 500))
+            stages = benchmark_size(directory, package_count, location_count, options.seed, options)
+            for name, value in stages:
+                print(str(package_count).rjust(8) + " packages | " + name.ljust(13) + " | " + str(round(value, 4)))
+            results.append(json_object([("packages", package_count), ("locations", location_count)] + stages))
+    header = json_object([("commit", git_commit()), ("python", platform.python_version()), ("seed", options.seed),
+                          ("trucks", options.trucks), ("drivers", options.drivers), ("clusters", options.clusters),
+                          ("improve_routes", options.improve_routes),
+                          ("table_type", options.table_type.__name__)])
+    with open(options.output, "w") as file:
+        file.write("{\"settings\": " + header + ",\n \"results\": [\n  " + ",\n  ".join(results) + "\n]}\n")
+    print("Results written to " + options.output)
+
+
+if __name__ == "__main__":
+    main()
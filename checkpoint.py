@@ -0,0 +1,138 @@
+from wgups import Location, load_location_table, DEFAULT_LOCATIONS_PATH
+from array import array
+from hashlib import sha256
+import gzip
+import io
+import pickle
+
+
+# Snapshots of a simulation in mid-run which can be forked any number of times, each fork continuing from the
+# same point under different decisions, and saved to disk to be forked later. A snapshot holds only the state
+# which changes during the day: the clock, the packages, the hub's tables and indexes, the trucks and their
+# manifests, the scheduled events, and the history. The locations and the distance matrix never change, so they
+# are written as references which are resolved against the locations the snapshot is forked onto. Snapshots
+# are pickled, so only load files from a trusted source.
+MAGIC = b"WGUPSCKP"
+VERSION = 1
+
+
+# Returns a digest of the location rows and distances, which must match for a snapshot to be loaded onto a set of
+# locations. The distances are hashed as 32 bit integers, so a table loaded from the csv file and the same table
+# loaded from the binary cache have the same digest. O(n^2) where n is the number of locations.
+def location_digest(rows, distances):
+    digest = sha256()
+    for row in rows:
+        digest.update("\x1f".join(row).encode("utf-8") + b"\x1e")
+    digest.update(array("i", distances.values).tobytes())
+    return digest.digest()
+
+
+class SnapshotPickler(pickle.Pickler):
+    # This class pickles a simulator, writing references in place of the locations other than the hub, the
+    # distance matrix, and the hub's view of its row, and leaving out the profiler. This is called for every
+    # object pickled, so the shared objects are recognized by their exact type and identity, which also works
+    # whichever module the simulator's classes were loaded from. Initializes in O(1)
+    def __init__(self, file, simulator):
+        super().__init__(file, pickle.HIGHEST_PROTOCOL)
+        self.hub = simulator.hub
+        self.location_class = type(simulator.locations[-1])
+        self.profiler = simulator.profiler
+
+    # Returns the reference written in place of a shared object, or None for objects which are pickled. O(1)
+    def persistent_id(self, obj):
+        if type(obj) is self.location_class and obj is not self.hub:
+            return ("location", obj.location_id)
+        if obj is self.hub.distances:
+            return ("distances",)
+        if obj is self.hub.distance_row:
+            return ("row", self.hub.location_id)
+        if obj is self.profiler and obj is not None:
+            return ("profiler",)
+        return None
+
+
+class SnapshotUnpickler(pickle.Unpickler):
+    # This class unpickles a simulator, resolving the references written by SnapshotPickler against the given
+    # locations and distance matrix. The fork is given no profiler. Initializes in O(1)
+    def __init__(self, file, locations, distances):
+        super().__init__(file)
+        self.locations = locations
+        self.distances = distances
+
+    # Returns the shared object for a reference. O(1)
+    def persistent_load(self, pid):
+        if pid[0] == "location":
+            return self.locations[pid[1]]
+        if pid[0] == "distances":
+            return self.distances
+        if pid[0] == "row":
+            return self.distances.row(pid[1])
+        if pid[0] == "profiler":
+            return None
+        raise pickle.UnpicklingError("unknown reference " + repr(pid))
+
+
+class Checkpoint(object):
+    # This class holds a snapshot of a simulator as pickled bytes, so the snapshot stays the same however the
+    # simulator carries on. Each fork is a new simulator built from the snapshot which shares the locations and
+    # distances. Initializes in O(n) in the size of the simulator's changing state.
+    def __init__(self, simulator=None):
+        self.data = None
+        self.locations = None
+        self.distances = None
+        # The digest of the locations, computed when the snapshot is first saved.
+        self.digest = None
+        if simulator is not None:
+            buffer = io.BytesIO()
+            SnapshotPickler(buffer, simulator).dump(simulator)
+            self.data = buffer.getvalue()
+            self.locations = simulator.locations
+            self.distances = simulator.hub.distances
+
+    # Allows len() function to take this object as an argument. Returns the size of the snapshot in bytes. O(1)
+    def __len__(self):
+        return len(self.data)
+
+    # Returns a new simulator in the state the snapshot was taken in. Call resume on it to continue the day. O(n)
+    # in the size of the snapshot.
+    def fork(self):
+        return SnapshotUnpickler(io.BytesIO(self.data), self.locations, self.distances).load()
+
+    # Writes the snapshot to a gzip compressed file along with a digest of the locations it was taken on. O(n) in
+    # the size of the snapshot, plus O(m^2) where m is the number of locations.
+    def save(self, file_path):
+        if self.digest is None:
+            rows = [(location.address, location.city, location.zip_code) for location in self.locations]
+            self.digest = location_digest(rows, self.distances)
+        with gzip.open(file_path, "wb") as file:
+            file.write(MAGIC)
+            file.write(VERSION.to_bytes(4, "little"))
+            file.write(self.digest)
+            file.write(self.data)
+
+
+# Reads a snapshot written by Checkpoint.save and returns it as a Checkpoint whose forks use the locations from the
+# given file, or from a location table already returned by load_location_table. Raises a ValueError if the file is
+# not a snapshot or was taken on different locations. O(n) in the size of the snapshot, plus the time to load the
+# locations if no table is given.
+def load_checkpoint(file_path, locations_path=DEFAULT_LOCATIONS_PATH, location_table=None):
+    if location_table is None:
+        location_table = load_location_table(locations_path)
+    rows, distances = location_table
+    with gzip.open(file_path, "rb") as file:
+        if file.read(len(MAGIC)) != MAGIC or int.from_bytes(file.read(4), "little") != VERSION:
+            raise ValueError(file_path + ": not a simulator snapshot of version " + str(VERSION))
+        digest = file.read(32)
+        if digest != location_digest(rows, distances):
+            raise ValueError(file_path + ": the snapshot was taken on different locations")
+        data = file.read()
+    checkpoint = Checkpoint()
+    checkpoint.data = data
+    checkpoint.distances = distances
+    checkpoint.digest = digest
+    # The hub is part of the snapshot, so it is never looked up in the locations.
+    checkpoint.locations = [None]
+    for i in range(1, len(rows)):
+        address, city, zip_code = rows[i]
+        checkpoint.locations.append(Location(i, address, city, zip_code, distances))
+    return checkpoint
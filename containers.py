@@ -1,3 +1,7 @@
+from array import array
+from contextlib import contextmanager
+
+
 class HashTable(object):
     # O(n) to initialize the underlying list. Length and load factor can be customized at instantiation
     # to minimize how often the hash table needs to resize.
@@ -23,10 +27,12 @@ class HashTable(object):
     def __delitem__(self, key):
         self.remove(key)
 
-    # Allows stored elements to be iterated in for each loop.
-    # This method is O(1) though iteration itself is O(n).
+    # Allows stored key-value pairs to be iterated in for each loop. The pairs are stored as tuples, so they are
+    # handed out directly without copying and cannot be changed by the caller. This method is O(1) though
+    # iteration itself is O(n).
     def __iter__(self):
-        return HashTableIterator(self)
+        for bucket in self.array:
+            yield from bucket
 
     # Allows use of the in keyword to test existence of key in hash table.
     # O(1) time complexity if there are few hash collisions
@@ -38,14 +44,18 @@ class HashTable(object):
         return False
 
     # Allows for the keys stored in the hash table to be iterated.
-    # This method is O(1)
+    # This method is O(1) though iteration itself is O(n).
     def key_iterator(self):
-        return HashKeyIterator(self)
+        for bucket in self.array:
+            for key, value in bucket:
+                yield key
 
     # Allows for the values stored in the hash table to be iterated.
-    # This method is O(1)
+    # This method is O(1) though iteration itself is O(n).
     def value_iterator(self):
-        return HashValueIterator(self)
+        for bucket in self.array:
+            for key, value in bucket:
+                yield value
 
     # Calculates the hash value used for the index of the underlying list. O(1)
     def hash(self, key):
@@ -57,19 +67,52 @@ class HashTable(object):
     # If the hash table is instantiated with appropriate length and load factor for the data set,
     # resizing will never be needed and this method will always run in O(1).
     def add(self, key, value):
-        index = self.hash(key)
+        bucket = self.array[self.hash(key)]
         done = False
-        for kvp in self.array[index]:
-            if kvp[0] == key:
-                kvp[1] = value
+        for i in range(len(bucket)):
+            if bucket[i][0] == key:
+                bucket[i] = (key, value)
                 done = True
                 break
         if not done:
-            self.array[index].append([key, value])
+            bucket.append((key, value))
             self.len += 1
         if self.is_full():
             self.double()
 
+    # Creates a hash table sized for the given number of entries and loads the key-value pairs into it, so the
+    # table never resizes while it is being filled. O(n)
+    @classmethod
+    def from_pairs(cls, pairs, capacity=16, load_factor=.75):
+        table = cls(length_for(capacity, load_factor), load_factor)
+        table.bulk_load(pairs)
+        return table
+
+    # Adds every key-value pair from an iterable of pairs. If the number of pairs is known up front the table is
+    # resized once before any are added, and the load factor is checked only once at the end instead of after
+    # every pair. O(n)
+    def bulk_load(self, pairs):
+        if hasattr(pairs, "__len__"):
+            self.reserve(len(self) + len(pairs))
+        for key, value in pairs:
+            bucket = self.array[self.hash(key)]
+            for i in range(len(bucket)):
+                if bucket[i][0] == key:
+                    bucket[i] = (key, value)
+                    break
+            else:
+                bucket.append((key, value))
+                self.len += 1
+        if self.is_full():
+            self.resize(length_for(len(self), self.load_factor, len(self.array)))
+
+    # Grows the underlying list, if needed, so that the given number of entries fit without exceeding the load
+    # factor. The table is resized at most once. O(n)
+    def reserve(self, capacity):
+        length = length_for(capacity, self.load_factor, len(self.array))
+        if length > len(self.array):
+            self.resize(length)
+
     # Removes a key-value pair from the hash table in O(1)
     def remove(self, key):
         index = self.hash(key)
@@ -103,62 +146,348 @@ class HashTable(object):
     # Resizes the underlying list and copies the existing key-value pairs to the new list.
     # Runs in O(n)
     def double(self):
-        new_ht = HashTable(len(self.array) * 2, self.load_factor)
-        for kvp in self:
-            new_ht.add(kvp[0], kvp[1])
-        self.array = new_ht.array
+        self.resize(len(self.array) * 2)
 
+    # Replaces the underlying list with one of the given length and moves the existing key-value pairs into it
+    # directly, since none of them can already be present in the new list. Runs in O(n)
+    def resize(self, length):
+        old_array = self.array
+        self.array = [[] for _ in range(length)]
+        for bucket in old_array:
+            for kvp in bucket:
+                self.array[self.hash(kvp[0])].append(kvp)
 
-class HashTableIterator(object):
-    # O(1) to initialize dedicated iterator class
-    def __init__(self, hash_table):
-        self.outer = 0
-        self.inner = 0
-        self.ht = hash_table
 
-    # Conforms to iterator protocol. Runs in O(1)
-    def __iter__(self):
-        return self
-
-    # The outer loop steps through the list underlying the hash table while the inner loop
-    # steps through each key-value pair stored at that index of the outer list. Since the
-    # inner list returns immediately if a value is present, it is O(1). The outer list could
-    # be considered O(n) in the sense that it might take longer to find the next value in a
-    # sparsely populated HashTable, but in practice it finds the next value in O(1) if the length
-    # of the list is appropriate for the amount of data in the HashTable.
-    def __next__(self):
-        while self.outer < len(self.ht.array):
-            while self.inner < len(self.ht.array[self.outer]):
-                next_kvp = self.ht.array[self.outer][self.inner]
-                self.inner += 1
-                return next_kvp
-            self.outer += 1
-            self.inner = 0
-        raise StopIteration
-
-
-class HashKeyIterator(object):
-    # Provides an abstraction to iterate on the keys of the HashTable. O(1) to initialize.
-    def __init__(self, hash_table):
-        self.iterator = HashTableIterator(hash_table)
-
-    # Conforms to iterator protocol. Runs in O(1)
-    def __iter__(self):
-        return self
+# Markers for slots in an OpenHashTable which have never held a key or which held a key that was removed.
+EMPTY = object()
+DELETED = object()
 
-    # Returns the key from the key-value pair returned by HashTableIterator.__next__() in O(1)
-    def __next__(self):
-        return self.iterator.__next__()[0]
 
+class OpenHashTable(object):
+    # This is an alternative to HashTable with the same interface which uses open addressing with linear probing
+    # instead of a list of lists. Keys and values are stored in two parallel lists, so each entry costs two slots
+    # rather than a list of its own. Removed keys leave a DELETED marker so that probing continues past them, and
+    # those markers count toward the load factor until the table is resized. O(n) to initialize the underlying
+    # lists.
+    def __init__(self, length=16, load_factor=.75):
+        self.keys = [EMPTY] * length
+        self.values = [None] * length
+        self.load_factor = load_factor
+        self.len = 0
+        self.used = 0
 
-class HashValueIterator(object):
-    def __init__(self, hash_table):
-        self.iterator = HashTableIterator(hash_table)
+    # Allows len() function to take this object as an argument. O(1)
+    def __len__(self):
+        return self.len
 
-    # Conforms to iterator protocol. Runs in O(1)
+    # Allows retrieval using subscript syntax. O(1)
+    def __getitem__(self, key):
+        return self.get(key)
+
+    # Allows adding elements using subscript syntax. O(1) amortized (see comment on add method)
+    def __setitem__(self, key, value):
+        self.add(key, value)
+
+    # Allows removal of an element using del table[key] syntax. O(1)
+    def __delitem__(self, key):
+        self.remove(key)
+
+    # Allows stored key-value pairs to be iterated in for each loop. O(n)
     def __iter__(self):
-        return self
+        keys = self.keys
+        values = self.values
+        for i in range(len(keys)):
+            key = keys[i]
+            if key is not EMPTY and key is not DELETED:
+                yield key, values[i]
+
+    # Allows use of the in keyword to test existence of key in hash table. O(1) with a sensible load factor.
+    def __contains__(self, key):
+        return self.find(key) >= 0
+
+    # Allows for the keys stored in the hash table to be iterated. O(n)
+    def key_iterator(self):
+        for key in self.keys:
+            if key is not EMPTY and key is not DELETED:
+                yield key
+
+    # Allows for the values stored in the hash table to be iterated. O(n)
+    def value_iterator(self):
+        keys = self.keys
+        values = self.values
+        for i in range(len(keys)):
+            key = keys[i]
+            if key is not EMPTY and key is not DELETED:
+                yield values[i]
+
+    # Calculates the hash value used for the first slot probed for a key. O(1)
+    def hash(self, key):
+        return hash(key) % len(self.keys)
+
+    # Returns the slot holding the given key, or -1 if it is not stored. Probing stops at the first slot which
+    # has never been used. O(1) with a sensible load factor.
+    def find(self, key):
+        keys = self.keys
+        length = len(keys)
+        index = self.hash(key)
+        while True:
+            slot_key = keys[index]
+            if slot_key is EMPTY:
+                return -1
+            if slot_key is not DELETED and slot_key == key:
+                return index
+            index = (index + 1) % length
+
+    # Adds a key-value pair to the hash table, or replaces the value of an existing key. A new key goes in the
+    # first DELETED or EMPTY slot on its probe sequence. O(1) amortized, like HashTable.add.
+    def add(self, key, value):
+        keys = self.keys
+        length = len(keys)
+        index = self.hash(key)
+        free = -1
+        while True:
+            slot_key = keys[index]
+            if slot_key is EMPTY:
+                break
+            if slot_key is DELETED:
+                if free < 0:
+                    free = index
+            elif slot_key == key:
+                self.values[index] = value
+                return
+            index = (index + 1) % length
+        if free < 0:
+            free = index
+            self.used += 1
+        keys[free] = key
+        self.values[free] = value
+        self.len += 1
+        if self.is_full():
+            self.double()
+
+    # Creates a hash table sized for the given number of entries and loads the key-value pairs into it, so the
+    # table never resizes while it is being filled. O(n)
+    @classmethod
+    def from_pairs(cls, pairs, capacity=16, load_factor=.75):
+        table = cls(length_for(capacity, load_factor), load_factor)
+        table.bulk_load(pairs)
+        return table
+
+    # Adds every key-value pair from an iterable of pairs. The table is resized at most once, up front, so that
+    # every pair fits alongside the DELETED markers, and the pairs are then written straight into their slots
+    # without checking the load factor after each one. Pairs without a known length are read into a list first,
+    # since an open addressing table cannot be let fill up and resized afterward. O(n)
+    def bulk_load(self, pairs):
+        if not hasattr(pairs, "__len__"):
+            pairs = list(pairs)
+        length = length_for(len(self) + len(pairs), self.load_factor, len(self.keys))
+        if length > len(self.keys) or self.used + len(pairs) > length * self.load_factor:
+            self.resize(length)
+        keys = self.keys
+        values = self.values
+        for key, value in pairs:
+            index = hash(key) % length
+            free = -1
+            while True:
+                slot_key = keys[index]
+                if slot_key is EMPTY or (slot_key is not DELETED and slot_key == key):
+                    break
+                if slot_key is DELETED and free < 0:
+                    free = index
+                index = (index + 1) % length
+            if slot_key is not EMPTY:
+                values[index] = value
+                continue
+            if free < 0:
+                free = index
+                self.used += 1
+            keys[free] = key
+            values[free] = value
+            self.len += 1
+
+    # Grows the underlying lists, if needed, so that the given number of entries fit without exceeding the load
+    # factor. The table is resized at most once. O(n)
+    def reserve(self, capacity):
+        length = length_for(capacity, self.load_factor, len(self.keys))
+        if length > len(self.keys):
+            self.resize(length)
+
+    # Removes a key-value pair from the hash table in O(1), leaving a DELETED marker in its slot.
+    def remove(self, key):
+        index = self.find(key)
+        if index >= 0:
+            self.keys[index] = DELETED
+            self.values[index] = None
+            self.len -= 1
+
+    # Retrieves the value stored under the given key in O(1)
+    def get(self, key):
+        index = self.find(key)
+        if index < 0:
+            raise KeyError()
+        return self.values[index]
+
+    # Simultaneously removes a key-value pair and returns the value in O(1)
+    def pop(self, key):
+        index = self.find(key)
+        if index >= 0:
+            value = self.values[index]
+            self.keys[index] = DELETED
+            self.values[index] = None
+            self.len -= 1
+            return value
+
+    # Returns True if the number of used slots, including DELETED markers, exceeds the load factor. O(1)
+    def is_full(self):
+        return self.used > len(self.keys) * self.load_factor
+
+    # Replaces the underlying lists with new ones, dropping DELETED markers. The length doubles unless removing
+    # the markers alone brings the table back under its load factor. Runs in O(n)
+    def double(self):
+        length = len(self.keys)
+        if self.len >= length * self.load_factor / 2:
+            length *= 2
+        self.resize(length)
+
+    # Replaces the underlying lists with ones of the given length and moves the stored key-value pairs into them,
+    # dropping DELETED markers. Runs in O(n)
+    def resize(self, length):
+        old_keys = self.keys
+        old_values = self.values
+        self.keys = [EMPTY] * length
+        self.values = [None] * length
+        self.used = self.len
+        for i in range(len(old_keys)):
+            key = old_keys[i]
+            if key is not EMPTY and key is not DELETED:
+                index = self.hash(key)
+                while self.keys[index] is not EMPTY:
+                    index = (index + 1) % length
+                self.keys[index] = key
+                self.values[index] = old_values[i]
+
+
+# Returns the length, doubling from the given minimum, that holds the given number of entries without exceeding
+# the load factor. Doubling keeps the lengths the same as a table which grew one entry at a time. O(log n)
+def length_for(capacity, load_factor=.75, minimum=16):
+    length = minimum
+    while capacity > length * load_factor:
+        length *= 2
+    return length
+
+
+# The class used by new_table, which the simulator calls wherever it needs a hash table. It can be changed with
+# use_table_type to run the simulator on OpenHashTable instead of HashTable.
+table_type = HashTable
+
+
+# Selects the hash table class returned by new_table. O(1)
+def use_table_type(table_class):
+    global table_type
+    table_type = table_class
+
+
+# Selects the given hash table class for the code in a with block and the class selected before again afterward,
+# so that choosing a class for one simulation does not carry over into the next. None keeps the current class.
+# O(1)
+@contextmanager
+def using_table_type(table_class):
+    previous = table_type
+    if table_class is not None:
+        use_table_type(table_class)
+    try:
+        yield
+    finally:
+        use_table_type(previous)
+
+
+# Creates an empty hash table of the selected class. If a capacity is given, the table is sized to hold that
+# many entries without resizing. O(n) where n is the length of the underlying list.
+def new_table(length=16, load_factor=.75, capacity=0):
+    return table_type(length_for(capacity, load_factor, length), load_factor)
+
+
+class DisjointSet(object):
+    # Keeps items in groups which are merged with union and identified by a representative item returned by find.
+    # Each group is a tree of parent links kept shallow by union by size and path compression, so that any
+    # sequence of operations runs in nearly O(1) amortized time per operation. Initializes in O(1)
+    def __init__(self, capacity=0):
+        self.parents = new_table(capacity=capacity)
+        self.sizes = new_table(capacity=capacity)
+
+    # Allows len() function to take this object as an argument. Returns the number of items. O(1)
+    def __len__(self):
+        return len(self.parents)
+
+    # Allows use of the in keyword to test whether an item has been added. O(1)
+    def __contains__(self, item):
+        return item in self.parents
+
+    # Adds an item in a group of its own if it has not been added already. O(1)
+    def add(self, item):
+        if item not in self.parents:
+            self.parents.add(item, item)
+            self.sizes.add(item, 1)
+
+    # Returns the representative of the item's group, adding the item first if needed. The parent links are
+    # followed in a loop rather than recursively so that long chains cannot exhaust the recursion limit, then
+    # every item passed on the way is pointed straight at the representative. O(1) amortized
+    def find(self, item):
+        self.add(item)
+        root = item
+        while self.parents[root] != root:
+            root = self.parents[root]
+        while item != root:
+            parent = self.parents[item]
+            self.parents[item] = root
+            item = parent
+        return root
+
+    # Merges the groups of the two items, hanging the smaller tree under the larger one, and returns the
+    # representative of the merged group. O(1) amortized
+    def union(self, item, other_item):
+        root = self.find(item)
+        other_root = self.find(other_item)
+        if root == other_root:
+            return root
+        if self.sizes[root] < self.sizes[other_root]:
+            root, other_root = other_root, root
+        self.parents[other_root] = root
+        self.sizes[root] = self.sizes[root] + self.sizes[other_root]
+        self.sizes.remove(other_root)
+        return root
+
+
+class DistanceMatrix(object):
+    # Stores a square, symmetric table of integer distances in a single contiguous array of machine integers
+    # rather than a list of lists, so every lookup is one multiplication and one index into the array.
+    # Initializes in O(n^2) where n is the number of rows, but only because the array itself has n^2 elements.
+    def __init__(self, size, values=None):
+        self.size = size
+        if values is None:
+            values = array("i", [0]) * (size * size)
+        self.values = values
+
+    # Allows len() function to take this object as an argument. Returns the number of rows. O(1)
+    def __len__(self):
+        return self.size
+
+    # Stores the distance between two indices in both directions to keep the matrix symmetric. O(1)
+    def set(self, row, col, value):
+        self.values[row * self.size + col] = value
+        self.values[col * self.size + row] = value
+
+    # Retrieves the distance between two indices. O(1)
+    def get(self, row, col):
+        return self.values[row * self.size + col]
+
+    # Returns a view of the distances from one index to every other index without copying them, which
+    # allows callers to index into it directly. O(1)
+    def row(self, index):
+        return memoryview(self.values)[index * self.size:(index + 1) * self.size]
 
-    # Returns the value from the key-value pair returned by HashTableIterator.__next__() in O(1)
-    def __next__(self):
-        return self.iterator.__next__()[1]
+    # Looks up the distances from one index to each of the given indices in a single batch. O(n) where n is
+    # the number of indices given.
+    def distances_from(self, row, cols):
+        distances = self.row(row)
+        return [distances[col] for col in cols]
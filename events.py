@@ -0,0 +1,159 @@
+from datetime import datetime, time, timedelta
+from heapq import heappush, heappop
+
+
+# Scheduled events which change the state of the simulation at a given time of day, such as delayed packages
+# arriving at the hub, corrected addresses, and truck breakdowns. Events are loaded from a csv file, kept in a
+# heap ordered by time, and applied to the simulator when they come due, so the simulator only ever looks at the
+# earliest event instead of checking every event at every step.
+#
+# Each row of the events file is a time in the format HH:MM or HH:MM:SS, an event type, and the event's fields:
+#   09:05,release              every delayed package arrives at the hub
+#   09:05,release,6,25         only packages 6 and 25 arrive at the hub
+#   10:20,address,9,410 S State St,Salt Lake City,84111
+#                              package 9 is going to a new address, which must be on the network
+#   11:00,breakdown,1,45       truck 1 cannot move for 45 minutes
+
+
+class ReleasePackages(object):
+    # Delayed packages arriving at the hub. package_ids is a list of the packages which arrive, or None for every
+    # delayed package. Initializes in O(1)
+    def __init__(self, event_time, package_ids=None):
+        self.time = event_time
+        self.package_ids = package_ids
+
+    # O(n) in the number of packages released.
+    def apply(self, simulator):
+        simulator.hub.release_delayed_packages(self.package_ids)
+
+
+class CorrectAddress(object):
+    # A package's delivery location being corrected. The location is resolved when the event is loaded.
+    # Initializes in O(1)
+    def __init__(self, event_time, package_id, location):
+        self.time = event_time
+        self.package_id = package_id
+        self.location = location
+
+    # Same time complexity as Simulator.correct_address.
+    def apply(self, simulator):
+        simulator.correct_address(simulator.hub.all_packages[self.package_id], self.location)
+
+
+class TruckBreakdown(object):
+    # A truck stopping wherever it is for the given number of minutes. Applying it schedules a TruckRepair for
+    # when the truck can move again. Initializes in O(1)
+    def __init__(self, event_time, truck_id, minutes):
+        self.time = event_time
+        self.truck_id = truck_id
+        self.minutes = minutes
+
+    # O(log n) to schedule the repair.
+    def apply(self, simulator):
+        simulator.find_truck(self.truck_id).broken_down = True
+        repaired_at = (datetime.combine(simulator.clock.dummy_date, self.time) + timedelta(minutes=self.minutes)).time()
+        simulator.schedule.push(TruckRepair(repaired_at, self.truck_id))
+
+
+class TruckRepair(object):
+    # A broken down truck being able to move again. Initializes in O(1)
+    def __init__(self, event_time, truck_id):
+        self.time = event_time
+        self.truck_id = truck_id
+
+    # O(n) in the number of trucks to find the truck.
+    def apply(self, simulator):
+        simulator.find_truck(self.truck_id).broken_down = False
+
+
+class EventSchedule(object):
+    # This class keeps events in a heap ordered by time. Events with the same time come out in the order they were
+    # added. Initializes in O(1)
+    def __init__(self, events=()):
+        self.heap = []
+        self.count = 0
+        for event in events:
+            self.push(event)
+
+    # Allows len() function to take this object as an argument. Returns the number of events still to come. O(1)
+    def __len__(self):
+        return len(self.heap)
+
+    # Adds an event to the schedule. O(log n)
+    def push(self, event):
+        heappush(self.heap, (event.time, self.count, event))
+        self.count += 1
+
+    # Returns the time of the next event, or None if there are no more events. O(1)
+    def next_time(self):
+        if len(self.heap) == 0:
+            return None
+        return self.heap[0][0]
+
+    # Removes and returns the next event if it is due at the given time, otherwise returns None. O(log n)
+    def pop_due(self, now):
+        if len(self.heap) == 0 or self.heap[0][0] > now:
+            return None
+        return heappop(self.heap)[2]
+
+
+# Converts text in the format HH:MM or HH:MM:SS to a time. Raises a ValueError if the text is not a valid time.
+# O(1)
+def parse_event_time(text):
+    parts = text.strip().split(":")
+    if len(parts) < 2 or len(parts) > 3:
+        raise ValueError("invalid time " + repr(text) + ", expected HH:MM")
+    return time(*[int(part) for part in parts])
+
+
+# Creates the event described by one row of the events file. find_location looks up a location by address, city,
+# and zip code and returns None if it is not on the network. Raises a ValueError if the row is malformed. O(n) in
+# the number of fields.
+def parse_event_row(row, find_location):
+    if len(row) < 2:
+        raise ValueError("expected a time and an event type")
+    event_time = parse_event_time(row[0])
+    event_type = row[1].strip()
+    fields = [field.strip() for field in row[2:] if field.strip() != ""]
+    if event_type == "release":
+        return ReleasePackages(event_time, [int(field) for field in fields] if len(fields) != 0 else None)
+    if event_type == "address":
+        if len(fields) != 4:
+            raise ValueError("expected a package ID, address, city, and zip code")
+        location = find_location(fields[1], fields[2], fields[3])
+        if location is None:
+            raise ValueError("no location matches " + ", ".join(fields[1:]))
+        return CorrectAddress(event_time, int(fields[0]), location)
+    if event_type == "breakdown":
+        if len(fields) != 2:
+            raise ValueError("expected a truck ID and a number of minutes")
+        return TruckBreakdown(event_time, int(fields[0]), int(fields[1]))
+    raise ValueError("unknown event type " + repr(event_type))
+
+
+# Reads the events from a csv file, skipping blank lines and lines starting with #. Raises a ValueError naming the
+# line of the first malformed row. O(n)
+def read_events(file_path, find_location):
+    import csv
+    events = []
+    with open(file_path, newline="") as file:
+        reader = csv.reader(file)
+        for row in reader:
+            if len(row) == 0 or row[0].strip() == "" or row[0].lstrip().startswith("#"):
+                continue
+            try:
+                events.append(parse_event_row(row, find_location))
+            except ValueError as error:
+                raise ValueError(file_path + " line " + str(reader.line_num) + ": " + str(error))
+    return events
+
+
+# Raises a ValueError if an event refers to a package or truck which does not exist. Releasing a package which is
+# not delayed is allowed and does nothing. O(n) in the number of events.
+def validate_events(events, packages, truck_count):
+    for event in events:
+        if isinstance(event, CorrectAddress) and event.package_id not in packages:
+            raise ValueError("address correction at " + str(event.time) + " for unknown package " +
+                             str(event.package_id))
+        if isinstance(event, TruckBreakdown) and not 1 <= event.truck_id <= truck_count:
+            raise ValueError("breakdown at " + str(event.time) + " for unknown truck " + str(event.truck_id))
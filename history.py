@@ -0,0 +1,106 @@
+from array import array
+from bisect import bisect_right
+from datetime import datetime, timedelta
+from containers import new_table
+
+
+# Records how the packages and trucks change during one simulated day so that their state at any earlier time
+# can be answered without simulating the day again. Times are stored as the number of clock increments since the
+# start of the day, in one array per package and per truck, next to a list of the state recorded at each of
+# those times. Only changes are recorded, so a package has a handful of entries for the whole day and a truck
+# has one entry each time it starts or stops moving.
+
+
+class DeliveryHistory(object):
+    # This class keeps the time-ordered log for one simulation. It reads the time from the simulation's clock
+    # whenever something is recorded. Initializes in O(1)
+    def __init__(self, clock):
+        self.clock = clock
+        self.start = clock.current_datetime
+        self.increment = clock.increment
+        self.package_ticks = new_table()
+        self.package_records = new_table()
+        self.truck_ticks = new_table()
+        self.truck_records = new_table()
+        # The increment the simulation stopped at, and whether every package had been delivered by then.
+        self.end_tick = None
+        self.finished = False
+
+    # Returns the number of increments since the start of the day on the simulation's clock. O(1)
+    def current_tick(self):
+        return (self.clock.current_datetime - self.start) // self.increment
+
+    # Returns the number of whole increments from the start of the day until the clock reaches or passes the
+    # given time of day, which is the increment a simulation stopped at that time would end on, but no later
+    # than the end of this simulation. O(1)
+    def tick_at(self, time_of_day):
+        remaining = datetime.combine(self.start.date(), time_of_day) - self.start
+        tick = 0 if remaining <= timedelta(0) else -(-remaining // self.increment)
+        if self.end_tick is not None and tick > self.end_tick:
+            return self.end_tick
+        return tick
+
+    # Returns the time of day at the given number of increments since the start of the day. O(1)
+    def time_at(self, tick):
+        return (self.start + tick * self.increment).time()
+
+    # Adds an entry for the current time to a log, or replaces the last entry if it was recorded in the same
+    # increment, so that only the final state of each increment is kept. O(1) amortized
+    def append(self, ticks_table, records_table, key, record):
+        tick = self.current_tick()
+        if key not in ticks_table:
+            ticks_table.add(key, array("i"))
+            records_table.add(key, [])
+        ticks = ticks_table[key]
+        records = records_table[key]
+        if len(ticks) != 0 and ticks[-1] == tick:
+            records[-1] = record
+        else:
+            ticks.append(tick)
+            records.append(record)
+
+    # Records the current state of a package if it changed since it was last recorded. O(1) amortized
+    def record_package(self, package):
+        record = (package.state, package.truck_id, package.delivery_location, package.delivered_at, package.on_time)
+        if package.package_id in self.package_records and self.package_records[package.package_id][-1] == record:
+            return
+        self.append(self.package_ticks, self.package_records, package.package_id, record)
+
+    # Records the distance a truck has driven and whether it is moving, unless the last entry already accounts
+    # for both. A moving truck covers one tenth of a mile per increment until the simulator records it again,
+    # which it does whenever the truck arrives, starts waiting, or breaks down. O(1) amortized
+    def record_truck(self, truck, moving):
+        if truck.truck_id in self.truck_records:
+            tick = self.truck_ticks[truck.truck_id][-1]
+            mile_tenths, was_moving = self.truck_records[truck.truck_id][-1]
+            if was_moving:
+                mile_tenths += self.current_tick() - tick
+            if mile_tenths == truck.mile_tenths_driven and moving == was_moving:
+                return
+        self.append(self.truck_ticks, self.truck_records, truck.truck_id, (truck.mile_tenths_driven, moving))
+
+    # Marks the end of the simulation. O(1)
+    def end(self, finished):
+        self.end_tick = self.current_tick()
+        self.finished = finished
+
+    # Returns the recorded state of a package at the given increment as a tuple of its PackageStatus, truck ID,
+    # delivery location, delivery time, and whether it was on time. Raises a KeyError if the package was never
+    # recorded. O(log n) in the number of entries for the package.
+    def package_at(self, package_id, tick):
+        index = bisect_right(self.package_ticks[package_id], tick) - 1
+        return self.package_records[package_id][max(index, 0)]
+
+    # Returns the number of tenths of a mile a truck had driven by the given increment. O(log n) in the number of
+    # entries for the truck.
+    def truck_mile_tenths_at(self, truck_id, tick):
+        if truck_id not in self.truck_ticks:
+            return 0
+        ticks = self.truck_ticks[truck_id]
+        index = bisect_right(ticks, tick) - 1
+        if index < 0:
+            return 0
+        mile_tenths, moving = self.truck_records[truck_id][index]
+        if moving:
+            mile_tenths += tick - ticks[index]
+        return mile_tenths
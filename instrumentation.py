@@ -0,0 +1,101 @@
+from containers import new_table
+from reporting import json_object
+from time import perf_counter
+
+
+# Opt-in instrumentation for finding where a simulation spends its time. A Profiler replaces each target method
+# or function with a wrapper that counts its calls and adds up the time spent in them, and puts the originals
+# back when it stops, so nothing is measured and nothing costs extra unless a Profiler is running. Times are
+# cumulative, so a target that calls another target, directly or through recursion, includes that time too.
+
+
+class Profiler(object):
+    # Counters and cumulative timers for the instrumented targets. If json_path or pstats_path are given, stop
+    # writes a JSON summary or a cProfile statistics file there, and the statistics file can be read with the
+    # pstats module or any tool that reads cProfile output. Initializes in O(1)
+    def __init__(self, json_path=None, pstats_path=None):
+        self.json_path = json_path
+        self.pstats_path = pstats_path
+        self.names = []
+        self.calls = new_table()
+        self.seconds = new_table()
+        self.patched = []
+        self.profile = None
+
+    # Adds to a counter, creating it if needed. This can be called from anywhere to count events which are not
+    # function calls. O(1)
+    def count(self, name, amount=1):
+        if name not in self.calls:
+            self.names.append(name)
+            self.calls.add(name, 0)
+            self.seconds.add(name, 0.0)
+        self.calls[name] += amount
+
+    # Replaces each (owner, attribute name) target, where the owner is a class or module, with a wrapper that
+    # counts and times its calls, and starts cProfile if a statistics file was requested. O(n) in the number of
+    # targets.
+    def start(self, targets):
+        for owner, name in targets:
+            self.instrument(owner, name)
+        if self.pstats_path is not None:
+            import cProfile
+            self.profile = cProfile.Profile()
+            self.profile.enable()
+
+    # Puts back the original targets, stops cProfile, and writes the requested files. O(n) in the number of
+    # targets.
+    def stop(self):
+        if self.profile is not None:
+            self.profile.disable()
+            self.profile.dump_stats(self.pstats_path)
+            self.profile = None
+        while len(self.patched) != 0:
+            owner, name, original, was_own = self.patched.pop()
+            if was_own:
+                setattr(owner, name, original)
+            else:
+                delattr(owner, name)
+        if self.json_path is not None:
+            with open(self.json_path, "w") as file:
+                file.write(self.to_json())
+
+    # Replaces one target with a counting and timing wrapper. Targets inherited by a class are wrapped on that
+    # class only and removed again by stop. O(1)
+    def instrument(self, owner, name):
+        original = getattr(owner, name)
+        label = getattr(owner, "__name__", str(owner)).split(".")[-1] + "." + name
+        self.count(label, 0)
+        calls = self.calls
+        seconds = self.seconds
+
+        def timed(*args, **kwargs):
+            started = perf_counter()
+            try:
+                return original(*args, **kwargs)
+            finally:
+                calls[label] += 1
+                seconds[label] += perf_counter() - started
+
+        timed.__name__ = original.__name__
+        timed.__doc__ = original.__doc__
+        self.patched.append((owner, name, original, name in vars(owner)))
+        setattr(owner, name, timed)
+
+    # Returns the counters and timers as a JSON array with one object per target, in the order they were added.
+    # O(n)
+    def to_json(self):
+        lines = []
+        for name in self.names:
+            calls = self.calls[name]
+            seconds = self.seconds[name]
+            lines.append(json_object([("name", name), ("calls", calls), ("seconds", round(seconds, 6)),
+                                      ("mean_seconds", round(seconds / calls, 9) if calls != 0 else 0.0)]))
+        return "[\n" + ",\n".join(lines) + "\n]\n"
+
+    # Returns the lines of a table of the counters and timers sorted by total time, longest first. O(n log n)
+    def report(self):
+        lines = ["Calls      | Seconds    | Name"]
+        for name in sorted(self.names, key=lambda name: -self.seconds[name]):
+            lines.append(str(self.calls[name]).rjust(10) + " | " + ("%.6f" % self.seconds[name]).rjust(10) + " | " +
+                         name)
+        return lines
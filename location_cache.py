@@ -0,0 +1,126 @@
+from containers import DistanceMatrix
+from hashlib import sha256
+import mmap
+import os
+import struct
+
+
+# Binary cache of the location table. The file starts with a fixed header describing the csv file it was built
+# from, followed by the addresses as UTF-8 text and then the full distance matrix in tenths of a mile as 16 bit
+# integers, or 32 bit integers if any distance is too long for 16 bits. The matrix is memory-mapped when the
+# cache is loaded, so it is never parsed or copied and the operating system shares its pages between processes.
+MAGIC = b"WGUPSLOC"
+VERSION = 1
+# Magic, version, csv size, csv modification time, csv hash, location count, bytes per distance, text length
+HEADER = struct.Struct("<8sIqq32sIII")
+# Offset of the csv size and modification time in the header, after the magic and version.
+CSV_STATUS_OFFSET = struct.calcsize("<8sI")
+FIELD_SEPARATOR = "\x1f"
+ROW_SEPARATOR = "\x1e"
+
+
+# Returns the path of the cache file for the given csv file. O(1)
+def cache_path_for(csv_path):
+    return csv_path + ".cache"
+
+
+# Calculates the SHA-256 digest of a file, reading it in blocks so that large files are not held in memory.
+# O(n) in the size of the file.
+def file_digest(file_path):
+    digest = sha256()
+    with open(file_path, "rb") as file:
+        for block in iter(lambda: file.read(1 << 20), b""):
+            digest.update(block)
+    return digest.digest()
+
+
+# Writes the location rows, each an (address, city, zip code) tuple, and their distance matrix to the cache file
+# for the given csv file. The file is written under a temporary name and then renamed, so a reader never sees a
+# partly written cache. Returns False without raising if the cache cannot be written, since the cache is only an
+# optimization. O(n^2) where n is the number of locations.
+def write_cache(csv_path, rows, distances, cache_path=None):
+    from array import array
+    if cache_path is None:
+        cache_path = cache_path_for(csv_path)
+    typecode = "h" if max(distances.values, default=0) < 1 << 15 else "i"
+    matrix = array(typecode, distances.values)
+    text = ROW_SEPARATOR.join([FIELD_SEPARATOR.join(row) for row in rows]).encode("utf-8")
+    temporary_path = cache_path + ".tmp"
+    try:
+        status = os.stat(csv_path)
+        header = HEADER.pack(MAGIC, VERSION, status.st_size, status.st_mtime_ns, file_digest(csv_path), len(rows),
+                             matrix.itemsize, len(text))
+        with open(temporary_path, "wb") as file:
+            file.write(header)
+            file.write(text)
+            file.write(b"\0" * padding(HEADER.size + len(text), matrix.itemsize))
+            matrix.tofile(file)
+        os.replace(temporary_path, cache_path)
+        return True
+    except OSError:
+        return False
+
+
+# Returns the number of zero bytes needed after the given offset to align the matrix to its item size. O(1)
+def padding(offset, itemsize):
+    return -offset % itemsize
+
+
+# Loads the location rows and a DistanceMatrix backed by the memory-mapped cache file for the given csv file.
+# Returns None if there is no cache or if it was built from a different version of the csv file. The csv file's
+# size and modification time are checked first, and its hash is only calculated when they have changed, so a
+# file which was touched but not edited keeps its cache, and its new size and modification time are then stored
+# in the cache so the next load skips the hash again. See is_valid_cache for what this shortcut gives up. O(n)
+# where n is the number of locations, since the matrix itself is not read until it is used.
+def read_cache(csv_path, cache_path=None):
+    if cache_path is None:
+        cache_path = cache_path_for(csv_path)
+    try:
+        status = os.stat(csv_path)
+        with open(cache_path, "rb") as file:
+            mapped = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):
+        return None
+    if not is_valid_cache(mapped, csv_path, status):
+        mapped.close()
+        return None
+    magic, version, size, mtime_ns, digest, count, itemsize, text_length = HEADER.unpack_from(mapped)
+    if size != status.st_size or mtime_ns != status.st_mtime_ns:
+        refresh_header(cache_path, status)
+    matrix_offset = HEADER.size + text_length
+    matrix_offset += padding(matrix_offset, itemsize)
+    text = mapped[HEADER.size:HEADER.size + text_length].decode("utf-8")
+    rows = [tuple(row.split(FIELD_SEPARATOR)) for row in text.split(ROW_SEPARATOR)] if count > 0 else []
+    values = memoryview(mapped)[matrix_offset:].cast("h" if itemsize == 2 else "i")
+    return rows, DistanceMatrix(count, values)
+
+
+# Tests whether a memory-mapped cache file is complete and was built from the csv file with the given status.
+# A csv file with the same size and modification time as when the cache was built is trusted without hashing it,
+# as make and rsync do, so that loading a valid cache stays O(1) however large the csv file is. An edit which
+# keeps both the size and the modification time is not noticed; deleting the cache file forces a rebuild. O(1)
+# unless the csv file's size or modification time changed, in which case its hash is calculated in O(n).
+def is_valid_cache(mapped, csv_path, status):
+    if len(mapped) < HEADER.size:
+        return False
+    magic, version, size, mtime_ns, digest, count, itemsize, text_length = HEADER.unpack_from(mapped)
+    if magic != MAGIC or version != VERSION or itemsize not in (2, 4):
+        return False
+    matrix_offset = HEADER.size + text_length
+    matrix_offset += padding(matrix_offset, itemsize)
+    if len(mapped) != matrix_offset + count * count * itemsize:
+        return False
+    return (size == status.st_size and mtime_ns == status.st_mtime_ns) or digest == file_digest(csv_path)
+
+
+# Stores the csv file's current size and modification time in the header of its cache file after its hash was
+# found to match, so that later loads trust it without hashing it again. The rest of the file is left as it is.
+# Returns False without raising if the cache cannot be written, since the cache is only an optimization. O(1)
+def refresh_header(cache_path, status):
+    try:
+        with open(cache_path, "r+b") as file:
+            file.seek(CSV_STATUS_OFFSET)
+            file.write(struct.pack("<qq", status.st_size, status.st_mtime_ns))
+        return True
+    except OSError:
+        return False
@@ -0,0 +1,144 @@
+import csv
+import io
+import json
+import sys
+
+
+# Reports the state of the packages and trucks at the end of a simulation as a fixed-width table for people to
+# read, or as CSV or JSON Lines for other programs. Every format goes through a ReportWriter, which collects the
+# output and writes it in large blocks instead of one call per line, and only the requested format is built.
+FORMATS = ["table", "csv", "jsonl"]
+
+
+class ReportWriter(object):
+    # This class buffers report lines in memory and writes them to the stream together once the buffer holds
+    # buffer_size characters, and when the report is closed. Initializes in O(1)
+    def __init__(self, stream=None, buffer_size=1 << 16):
+        self.stream = sys.stdout if stream is None else stream
+        self.buffer_size = buffer_size
+        self.lines = []
+        self.size = 0
+
+    # Adds a line to the buffer and writes the buffer out if it is full. O(1) amortized
+    def write_line(self, line):
+        self.lines.append(line)
+        self.size += len(line) + 1
+        if self.size >= self.buffer_size:
+            self.flush()
+
+    # Writes every buffered line to the stream in one call. O(n) in the length of the buffered text
+    def flush(self):
+        if len(self.lines) != 0:
+            self.lines.append("")
+            self.stream.write("\n".join(self.lines))
+            self.lines = []
+            self.size = 0
+
+
+# Utility method to add spaces before or after a string. Runs in O(1)
+def pad_spaces(string, total_length, before=False):
+    spaces = " " * (total_length - len(string))
+    if before:
+        padded = spaces + string
+    else:
+        padded = string + spaces
+    return padded
+
+
+# Returns a JSON object with the given (name, value) pairs in order. O(n) in the number of pairs
+def json_object(pairs):
+    return "{" + ", ".join([json.dumps(name) + ": " + json.dumps(value) for name, value in pairs]) + "}"
+
+
+# Returns the fixed-width table row for a package. O(1)
+def package_row(package):
+    location = package.delivery_location
+    location_str = pad_spaces(location.address + ", " + location.city + ", UT " + location.zip_code, 66)
+    return (pad_spaces(str(package.package_id), 10, True) + " | " + location_str + " | " +
+            pad_spaces(str(package.weight) + " kg", 6, True) + " | " + pad_spaces(package.deadline, 8) + " | " +
+            package.status)
+
+
+# Writes the state of the packages and trucks in the given format, one of FORMATS, to the stream, which is
+# standard output by default. finish_time is the time the last package was delivered, or None if the simulation
+# stopped first. Raises a ValueError for an unknown format. O(n)
+def write_status(packages, clock, trucks, output_format="table", stream=None, finish_time=None):
+    writer = ReportWriter(stream)
+    if output_format == "table":
+        write_table(writer, packages, clock, trucks, finish_time)
+    elif output_format == "csv":
+        write_csv(writer, packages)
+    elif output_format == "jsonl":
+        write_json_lines(writer, packages, clock, trucks, finish_time)
+    else:
+        raise ValueError("Unknown report format " + repr(output_format) + ", expected one of " + ", ".join(FORMATS))
+    writer.flush()
+
+
+# Writes the fixed-width table of packages followed by the miles driven by each truck. O(n)
+def write_table(writer, packages, clock, trucks, finish_time):
+    writer.write_line(" ")
+    writer.write_line("Current time: " + str(clock.now()))
+    writer.write_line("Package ID | " + pad_spaces("Delivery Location", 66) + " | Weight | Deadline | Status")
+    for package in packages:
+        writer.write_line(package_row(package))
+    writer.write_line(" ")
+    mile_tenths = 0
+    for truck in trucks:
+        mile_tenths += truck.mile_tenths_driven
+        writer.write_line("Truck " + str(truck.truck_id) + " has driven " + str(truck.miles_driven()) + " miles")
+    writer.write_line("Total miles driven: " + str(mile_tenths / 10.0))
+    if finish_time is not None:
+        writer.write_line("Finished at " + str(finish_time))
+
+
+# Writes one CSV row per package with a header row. O(n)
+def write_csv(writer, packages):
+    buffer = io.StringIO()
+    rows = csv.writer(buffer, lineterminator="")
+    writer.write_line(csv_line(rows, buffer, ["package_id", "address", "city", "zip_code", "weight", "deadline",
+                                              "status", "truck_id", "delivered_at", "on_time"]))
+    for package in packages:
+        location = package.delivery_location
+        writer.write_line(csv_line(rows, buffer, [package.package_id, location.address, location.city,
+                                                  location.zip_code, package.weight, package.deadline,
+                                                  package.state.name, optional_text(package.truck_id),
+                                                  optional_text(package.delivered_at),
+                                                  optional_text(package.on_time)]))
+
+
+# Returns the text of an optional field for a CSV row, which is empty when the field has no value. O(1)
+def optional_text(value):
+    if value is None:
+        return ""
+    return str(value)
+
+
+# Returns a row formatted as a CSV line, quoting fields where needed, by writing it to a reusable buffer. O(1)
+def csv_line(rows, buffer, row):
+    buffer.seek(0)
+    buffer.truncate()
+    rows.writerow(row)
+    return buffer.getvalue()
+
+
+# Writes one JSON object per package, then one per truck, then one with the time and totals. O(n)
+def write_json_lines(writer, packages, clock, trucks, finish_time):
+    for package in packages:
+        location = package.delivery_location
+        writer.write_line(json_object([("type", "package"), ("package_id", package.package_id),
+                                       ("address", location.address), ("city", location.city),
+                                       ("zip_code", location.zip_code), ("weight", package.weight),
+                                       ("deadline", package.deadline), ("status", package.state.name),
+                                       ("truck_id", package.truck_id),
+                                       ("delivered_at", None if package.delivered_at is None else
+                                        str(package.delivered_at)),
+                                       ("on_time", package.on_time)]))
+    mile_tenths = 0
+    for truck in trucks:
+        mile_tenths += truck.mile_tenths_driven
+        writer.write_line(json_object([("type", "truck"), ("truck_id", truck.truck_id),
+                                       ("miles_driven", truck.miles_driven())]))
+    writer.write_line(json_object([("type", "summary"), ("time", str(clock.now())),
+                                   ("total_miles_driven", mile_tenths / 10.0),
+                                   ("finished_at", None if finish_time is None else str(finish_time))]))
@@ -0,0 +1,370 @@
+from time import perf_counter
+
+# Routing algorithms which work directly on location indices and a DistanceMatrix rather than on Location
+# and Package objects, so that the inner loops are made of list and array operations instead of method calls.
+
+
+# Returns the given location indices in the order they are visited when always driving to the nearest
+# unvisited location, starting from the start index. Each step looks up the distances from the current
+# location to all remaining candidates in one batch and takes the first minimum, so ties go to whichever
+# index appears first in the given order. The while loop runs n times and each batch lookup and argmin is
+# O(n), therefore it runs in O(n^2), but the inner O(n) work is done by built-in list operations.
+def nearest_neighbor_order(distances, indices, start):
+    remaining = list(indices)
+    order = []
+    current = start
+    while len(remaining) != 0:
+        candidate_distances = distances.distances_from(current, remaining)
+        current = remaining.pop(candidate_distances.index(min(candidate_distances)))
+        order.append(current)
+    return order
+
+
+# Tests whether every stop on the route is reached within its budget, which is the greatest distance that
+# can be driven before arriving there without missing the deadline. Stops without a budget in the given
+# HashTable have no deadline. O(n)
+def is_feasible(distances, start, route, budgets):
+    total = 0
+    last = start
+    for index in route:
+        total += distances.get(last, index)
+        last = index
+        if index in budgets and total > budgets[index]:
+            return False
+    return True
+
+
+# Shortens a route with 2-opt moves, which reverse a section of the route, and Or-opt moves, which move a
+# run of one to three consecutive stops elsewhere in the route. The change in length of each move is
+# computed from the few distances it affects, and only moves which shorten the route are tested against the
+# budgets. The first shortening move which keeps every stop within its budget is applied and the search starts
+# over, until no such move is left, max_iterations moves have been applied, or time_limit seconds have passed.
+# A route which already misses a budget is returned unchanged. Each search is O(n^2) moves with an O(n)
+# budget check for the moves which shorten the route, so this runs in O(n^3) per applied move at worst.
+def improve_route(distances, start, route, budgets, max_iterations=100, time_limit=0.01, return_to_start=True):
+    route = list(route)
+    if not is_feasible(distances, start, route, budgets):
+        return route
+    stop_time = perf_counter() + time_limit
+    iterations = 0
+    while iterations < max_iterations:
+        improved = two_opt_move(distances, start, route, budgets, return_to_start, stop_time)
+        if improved is None:
+            improved = or_opt_move(distances, start, route, budgets, return_to_start, stop_time)
+        if improved is None:
+            break
+        route = improved
+        iterations += 1
+    return route
+
+
+# Returns the route with the first feasible 2-opt move that shortens it applied, or None if there is none or
+# time runs out. Reversing route[i..j] only changes the edges on either side of the reversed section, since
+# the distances are symmetric. O(n^2) moves are evaluated in O(1) each.
+def two_opt_move(distances, start, route, budgets, return_to_start, stop_time):
+    count = len(route)
+    for i in range(count - 1):
+        if perf_counter() > stop_time:
+            return None
+        before = route[i - 1] if i > 0 else start
+        first = route[i]
+        for j in range(i + 1, count):
+            last = route[j]
+            delta = distances.get(before, last) - distances.get(before, first)
+            if j + 1 < count or return_to_start:
+                after = route[j + 1] if j + 1 < count else start
+                delta += distances.get(first, after) - distances.get(last, after)
+            if delta < 0:
+                candidate = route[:i] + route[i:j + 1][::-1] + route[j + 1:]
+                if is_feasible(distances, start, candidate, budgets):
+                    return candidate
+    return None
+
+
+# Returns the route with the first feasible Or-opt move that shortens it applied, or None if there is none or
+# time runs out. A run of one to three stops is removed and reinserted between two other consecutive stops;
+# the change in length is the cost of the new connections minus the cost of the old ones. O(n^2) moves are
+# evaluated in O(1) each.
+def or_opt_move(distances, start, route, budgets, return_to_start, stop_time):
+    count = len(route)
+    for length in range(1, 4):
+        for i in range(count - length + 1):
+            if perf_counter() > stop_time:
+                return None
+            segment = route[i:i + length]
+            rest = route[:i] + route[i + length:]
+            before = route[i - 1] if i > 0 else start
+            removal = distances.get(before, segment[0])
+            if i + length < count:
+                after = route[i + length]
+                removal += distances.get(segment[-1], after) - distances.get(before, after)
+            elif return_to_start:
+                removal += distances.get(segment[-1], start) - distances.get(before, start)
+            for k in range(len(rest) + 1):
+                if k == i:
+                    continue
+                previous = rest[k - 1] if k > 0 else start
+                insertion = distances.get(previous, segment[0])
+                if k < len(rest):
+                    insertion += distances.get(segment[-1], rest[k]) - distances.get(previous, rest[k])
+                elif return_to_start:
+                    insertion += distances.get(segment[-1], start) - distances.get(previous, start)
+                if insertion < removal:
+                    candidate = rest[:k] + segment + rest[k:]
+                    if is_feasible(distances, start, candidate, budgets):
+                        return candidate
+    return None
+
+
+# Partitions the given location indices into at most count clusters of nearby locations. The centers are first
+# spread out by farthest-first traversal, starting with the index farthest from start, and each index joins the
+# cluster of its nearest center. Each of the given number of rounds then moves every center to the member with
+# the least total distance to the rest of its cluster and assigns the indices again. Returns the centers and a
+# list of the members of each cluster in the same order, leaving out clusters which end up empty. Seeding and
+# each assignment are O(kn) where k is the number of clusters, and each round is O(n^2 / k) to find the centers
+# when the clusters are of similar size.
+def cluster_locations(distances, indices, count, start, rounds=2):
+    indices = list(indices)
+    if len(indices) == 0 or count < 1:
+        return [], []
+    nearest_center = distances.distances_from(start, indices)
+    centers = []
+    while len(centers) < min(count, len(indices)):
+        if len(centers) != 0 and max(nearest_center) == 0:
+            break
+        center = indices[nearest_center.index(max(nearest_center))]
+        centers.append(center)
+        center_distances = distances.distances_from(center, indices)
+        nearest_center = [min(pair) for pair in zip(nearest_center, center_distances)] if len(centers) > 1 \
+            else center_distances
+    members = assign_to_centers(distances, indices, centers)
+    for _ in range(rounds):
+        new_centers = []
+        for cluster in members:
+            if len(cluster) == 0:
+                new_centers.append(centers[len(new_centers)])
+                continue
+            totals = [sum(distances.distances_from(index, cluster)) for index in cluster]
+            new_centers.append(cluster[totals.index(min(totals))])
+        if new_centers == centers:
+            break
+        centers = new_centers
+        members = assign_to_centers(distances, indices, centers)
+    occupied = [i for i in range(len(centers)) if len(members[i]) != 0]
+    return [centers[i] for i in occupied], [members[i] for i in occupied]
+
+
+# Returns a list of the indices nearest to each center, in the order of the centers. Ties go to the center which
+# appears first. O(kn) where k is the number of centers.
+def assign_to_centers(distances, indices, centers):
+    members = [[] for _ in centers]
+    center_distances = [distances.distances_from(center, indices) for center in centers]
+    for i in range(len(indices)):
+        column = [row[i] for row in center_distances]
+        members[column.index(min(column))].append(indices[i])
+    return members
+
+
+# The budget of a stop without a deadline, which no arrival exceeds.
+NO_DEADLINE = float("inf")
+
+
+class RoutePlan(object):
+    # This class holds a route as a list of location indices with the budget of each stop, which is the greatest
+    # distance that can be driven before arriving there without missing its deadline, and keeps the distance
+    # driven before arriving at each stop and the slack of each stop, which is how much farther it could be
+    # reached without missing its deadline. A sparse table of the minimum slack over every run of stops whose
+    # length is a power of two answers the minimum slack over any run of stops in O(1). Together these allow
+    # inserting, removing, or swapping stops to be checked against every deadline in O(1) instead of walking
+    # the route. Changing the route rebuilds the arrivals and slack in O(n), and the sparse table is rebuilt in
+    # O(n log n) the next time a run of stops is checked, so a plan which is only tested with is_feasible never
+    # builds it. Stops may repeat, in which case the second visit costs nothing if it directly follows the first.
+    # Initializes in O(n)
+    def __init__(self, distances, start, stops, budgets):
+        self.distances = distances
+        self.start = start
+        self.stops = list(stops)
+        self.budgets = list(budgets)
+        self.arrivals = []
+        self.slack = []
+        self.min_slack_table = None
+        self.rebuild()
+
+    # Allows len() function to take this object as an argument. Returns the number of stops. O(1)
+    def __len__(self):
+        return len(self.stops)
+
+    # Recalculates the arrivals and the slack after the stops have changed, and discards the sparse table. O(n)
+    def rebuild(self):
+        self.arrivals = []
+        total = 0
+        last = self.start
+        for index in self.stops:
+            total += self.distances.get(last, index)
+            last = index
+            self.arrivals.append(total)
+        self.slack = [budget - arrival for budget, arrival in zip(self.budgets, self.arrivals)]
+        self.min_slack_table = None
+
+    # Builds the sparse table, in which row k holds the least slack of each run of 2^k stops. O(n log n)
+    def build_min_slack_table(self):
+        self.min_slack_table = [self.slack]
+        width = 1
+        while width * 2 <= len(self.slack):
+            previous = self.min_slack_table[-1]
+            self.min_slack_table.append([min(previous[i], previous[i + width])
+                                         for i in range(len(self.slack) - width * 2 + 1)])
+            width *= 2
+
+    # Returns the location index of the stop before the given position, which is the start for the first stop.
+    # O(1)
+    def previous(self, position):
+        if position == 0:
+            return self.start
+        return self.stops[position - 1]
+
+    # Returns the distance driven before leaving the stop before the given position. O(1)
+    def departure(self, position):
+        if position == 0:
+            return 0
+        return self.arrivals[position - 1]
+
+    # Returns the least slack of the stops from first through last, or NO_DEADLINE if there are none. O(1)
+    def min_slack(self, first, last=None):
+        if last is None:
+            last = len(self.stops) - 1
+        if first > last:
+            return NO_DEADLINE
+        if self.min_slack_table is None:
+            self.build_min_slack_table()
+        level = (last - first + 1).bit_length() - 1
+        row = self.min_slack_table[level]
+        return min(row[first], row[last - (1 << level) + 1])
+
+    # Returns True if every stop is reached within its budget. O(1) once the sparse table is built, otherwise O(n)
+    # without building it.
+    def is_feasible(self):
+        if self.min_slack_table is None:
+            return min(self.slack, default=NO_DEADLINE) >= 0
+        return self.min_slack(0) >= 0
+
+    # Returns the position of the first stop at or after the given position which is not reached within its
+    # budget, or None if there is none. Binary search over the sparse table makes this O(log n).
+    def first_late(self, first=0):
+        if self.min_slack(first) >= 0:
+            return None
+        low = first
+        high = len(self.stops) - 1
+        while low < high:
+            middle = (low + high) // 2
+            if self.min_slack(first, middle) < 0:
+                high = middle
+            else:
+                low = middle + 1
+        return low
+
+    # Returns the total distance of the route, including the drive back to the start if return_to_start is
+    # True. O(1)
+    def length(self, return_to_start=False):
+        if len(self.stops) == 0:
+            return 0
+        if return_to_start:
+            return self.arrivals[-1] + self.distances.get(self.stops[-1], self.start)
+        return self.arrivals[-1]
+
+    # Returns how much farther every stop from the given position onward is reached if the location index is
+    # inserted before that position, or at the end if the position is the number of stops. O(1)
+    def insertion_delay(self, index, position):
+        previous = self.previous(position)
+        delay = self.distances.get(previous, index)
+        if position < len(self.stops):
+            delay += self.distances.get(index, self.stops[position]) - self.distances.get(previous,
+                                                                                         self.stops[position])
+        return delay
+
+    # Returns True if the location index can be inserted before the given position with the given budget while
+    # reaching it and the stops after it, up to the stop at position last if given, within their budgets. O(1)
+    def can_insert(self, index, budget, position, last=None):
+        arrival = self.departure(position) + self.distances.get(self.previous(position), index)
+        return arrival <= budget and self.insertion_delay(index, position) <= self.min_slack(position, last)
+
+    # Returns the position where inserting the location index adds the least distance while keeping it and the
+    # stops after it within their budgets, as a (position, added distance) tuple, or None if there is no such
+    # position. The stops before it are not affected by the insertion. Only the
+    # positions from first through last are tried, or all of them by default. Ties go to the earliest position.
+    # Every position is checked in O(1), so this runs in O(n).
+    def cheapest_insertion(self, index, budget, first=0, last=None):
+        if last is None:
+            last = len(self.stops)
+        best = None
+        for position in range(first, last + 1):
+            if self.can_insert(index, budget, position):
+                delay = self.insertion_delay(index, position)
+                if best is None or delay < best[1]:
+                    best = (position, delay)
+        return best
+
+    # Inserts the location index with the given budget before the given position. O(n)
+    def insert(self, index, budget, position):
+        self.stops.insert(position, index)
+        self.budgets.insert(position, budget)
+        self.rebuild()
+
+    # Returns how much farther every stop after the given position is reached if that stop is removed, which is
+    # negative when removing it shortens the route. O(1)
+    def removal_delay(self, position):
+        if position == len(self.stops) - 1:
+            return 0
+        previous = self.previous(position)
+        index = self.stops[position]
+        following = self.stops[position + 1]
+        return (self.distances.get(previous, following) - self.distances.get(previous, index) -
+                self.distances.get(index, following))
+
+    # Returns True if the stop at the given position can be removed while every other stop is still reached
+    # within its budget. Removing a stop can only make the route longer if the distances break the triangle
+    # inequality. O(1)
+    def can_remove(self, position):
+        return (self.min_slack(0, position - 1) >= 0 and
+                self.removal_delay(position) <= self.min_slack(position + 1))
+
+    # Removes the stop at the given position and returns its location index and budget. O(n)
+    def remove(self, position):
+        index = self.stops.pop(position)
+        budget = self.budgets.pop(position)
+        self.rebuild()
+        return index, budget
+
+    # Returns True if the stops at the two positions can trade places while every stop is still reached within
+    # its budget. Only the two stops and the drives next to them change, so the stops between them are all
+    # reached later or earlier by the same distance, as are the stops after the second one. O(1)
+    def can_swap(self, first, second):
+        if first > second:
+            first, second = second, first
+        if first == second:
+            return self.is_feasible()
+        if self.min_slack(0, first - 1) < 0:
+            return False
+        stops = self.stops
+        arrival = self.departure(first) + self.distances.get(self.previous(first), stops[second])
+        if arrival > self.budgets[second]:
+            return False
+        if second == first + 1:
+            arrival += self.distances.get(stops[second], stops[first])
+        else:
+            delay = arrival + self.distances.get(stops[second], stops[first + 1]) - self.arrivals[first + 1]
+            if delay > self.min_slack(first + 1, second - 1):
+                return False
+            arrival = self.arrivals[second - 1] + delay + self.distances.get(stops[second - 1], stops[first])
+        if arrival > self.budgets[first]:
+            return False
+        if second == len(stops) - 1:
+            return True
+        delay = arrival + self.distances.get(stops[first], stops[second + 1]) - self.arrivals[second + 1]
+        return delay <= self.min_slack(second + 1)
+
+    # Swaps the stops at the two positions. O(n)
+    def swap(self, first, second):
+        self.stops[first], self.stops[second] = self.stops[second], self.stops[first]
+        self.budgets[first], self.budgets[second] = self.budgets[second], self.budgets[first]
+        self.rebuild()
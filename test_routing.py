@@ -0,0 +1,133 @@
+from containers import DistanceMatrix
+from routing import RoutePlan, NO_DEADLINE
+import random
+import unittest
+
+
+# Compares the constant time checks of RoutePlan with walking the route one stop at a time on many small random
+# routes. Run with python -m unittest test_routing from the repository root.
+
+
+# Returns a random symmetric distance matrix with the given number of locations. O(n^2)
+def random_distances(generator, size):
+    distances = DistanceMatrix(size)
+    for i in range(size):
+        for j in range(i):
+            distances.set(i, j, generator.randint(0, 30))
+    return distances
+
+
+# Returns the slack of every stop on the route, walking it from the start. O(n)
+def walk_slack(distances, start, stops, budgets):
+    slack = []
+    total = 0
+    last = start
+    for index, budget in zip(stops, budgets):
+        total += distances.get(last, index)
+        last = index
+        slack.append(budget - total)
+    return slack
+
+
+# Returns True if every stop from position first onward is reached within its budget. O(n)
+def reached_in_time(distances, start, stops, budgets, first=0):
+    return min(walk_slack(distances, start, stops, budgets)[first:], default=NO_DEADLINE) >= 0
+
+
+class RoutePlanTest(unittest.TestCase):
+    # Builds the random routes shared by every test, each as (distances, stops, budgets). O(n) routes
+    def setUp(self):
+        generator = random.Random(1)
+        self.routes = []
+        for _ in range(500):
+            size = generator.randint(2, 12)
+            distances = random_distances(generator, size)
+            count = generator.randint(0, 9)
+            stops = [generator.randint(1, size - 1) for _ in range(count)]
+            budgets = [generator.choice([NO_DEADLINE, generator.randint(0, 150)]) for _ in range(count)]
+            self.routes.append((distances, stops, budgets, generator.randint(1, size - 1),
+                                generator.choice([NO_DEADLINE, generator.randint(0, 150)])))
+
+    def test_slack_matches_walk(self):
+        for distances, stops, budgets, _, _ in self.routes:
+            plan = RoutePlan(distances, 0, stops, budgets)
+            self.assertEqual(plan.slack, walk_slack(distances, 0, stops, budgets))
+            for first in range(len(stops)):
+                for last in range(first, len(stops)):
+                    self.assertEqual(plan.min_slack(first, last), min(plan.slack[first:last + 1]))
+
+    def test_is_feasible_and_first_late(self):
+        for distances, stops, budgets, _, _ in self.routes:
+            plan = RoutePlan(distances, 0, stops, budgets)
+            slack = walk_slack(distances, 0, stops, budgets)
+            self.assertEqual(plan.is_feasible(), reached_in_time(distances, 0, stops, budgets))
+            for first in range(len(stops)):
+                late = [i for i in range(first, len(stops)) if slack[i] < 0]
+                self.assertEqual(plan.first_late(first), late[0] if len(late) != 0 else None)
+
+    def test_can_insert(self):
+        for distances, stops, budgets, index, budget in self.routes:
+            plan = RoutePlan(distances, 0, stops, budgets)
+            for position in range(len(stops) + 1):
+                new_stops = stops[:position] + [index] + stops[position:]
+                new_budgets = budgets[:position] + [budget] + budgets[position:]
+                # Only the inserted stop and the stops after it are checked, since the stops before it are not
+                # affected by the insertion.
+                expected = reached_in_time(distances, 0, new_stops, new_budgets, position)
+                self.assertEqual(plan.can_insert(index, budget, position), expected)
+
+    def test_cheapest_insertion(self):
+        for distances, stops, budgets, index, budget in self.routes:
+            plan = RoutePlan(distances, 0, stops, budgets)
+            length = plan.length()
+            best = None
+            for position in range(len(stops) + 1):
+                new_stops = stops[:position] + [index] + stops[position:]
+                new_budgets = budgets[:position] + [budget] + budgets[position:]
+                if reached_in_time(distances, 0, new_stops, new_budgets, position):
+                    added = RoutePlan(distances, 0, new_stops, new_budgets).length() - length
+                    if best is None or added < best[1]:
+                        best = (position, added)
+            self.assertEqual(plan.cheapest_insertion(index, budget), best)
+
+    def test_insert_and_remove(self):
+        for distances, stops, budgets, index, budget in self.routes:
+            plan = RoutePlan(distances, 0, stops, budgets)
+            position = len(stops) // 2
+            plan.min_slack(0)
+            plan.insert(index, budget, position)
+            new_stops = stops[:position] + [index] + stops[position:]
+            new_budgets = budgets[:position] + [budget] + budgets[position:]
+            self.assertEqual(plan.slack, walk_slack(distances, 0, new_stops, new_budgets))
+            self.assertEqual(plan.is_feasible(), reached_in_time(distances, 0, new_stops, new_budgets))
+            self.assertEqual(plan.remove(position), (index, budget))
+            self.assertEqual(plan.slack, walk_slack(distances, 0, stops, budgets))
+
+    def test_can_remove(self):
+        for distances, stops, budgets, _, _ in self.routes:
+            plan = RoutePlan(distances, 0, stops, budgets)
+            for position in range(len(stops)):
+                new_stops = stops[:position] + stops[position + 1:]
+                new_budgets = budgets[:position] + budgets[position + 1:]
+                self.assertEqual(plan.can_remove(position), reached_in_time(distances, 0, new_stops, new_budgets))
+
+    def test_can_swap_and_swap(self):
+        for distances, stops, budgets, _, _ in self.routes:
+            plan = RoutePlan(distances, 0, stops, budgets)
+            for first in range(len(stops)):
+                for second in range(len(stops)):
+                    new_stops = list(stops)
+                    new_budgets = list(budgets)
+                    new_stops[first], new_stops[second] = new_stops[second], new_stops[first]
+                    new_budgets[first], new_budgets[second] = new_budgets[second], new_budgets[first]
+                    expected = reached_in_time(distances, 0, new_stops, new_budgets)
+                    self.assertEqual(plan.can_swap(first, second), expected)
+            if len(stops) >= 2:
+                plan.swap(0, len(stops) - 1)
+                new_stops = stops[-1:] + stops[1:-1] + stops[:1]
+                new_budgets = budgets[-1:] + budgets[1:-1] + budgets[:1]
+                self.assertEqual(plan.slack, walk_slack(distances, 0, new_stops, new_budgets))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,57 @@
+from containers import HashTable, OpenHashTable
+from datetime import time
+from wgups import parse_arguments, setup_simulator
+import unittest
+
+
+# Pins the report of the shipped day, so that a change to the hash tables or the routing which changes where the
+# trucks go shows up as a failure. Run with python -m unittest test_wgups from the repository root.
+
+
+# The time each shipped package is delivered, by package ID starting from 1.
+SHIPPED_DELIVERY_TIMES = [time(8, 40, 40), time(9, 30, 40), time(9, 11, 40), time(8, 37, 0), time(9, 4, 20),
+                          time(10, 23, 20), time(8, 50, 0), time(9, 13, 40), time(10, 41, 40), time(9, 2, 20),
+                          time(8, 21, 40), time(10, 59, 0), time(9, 15, 0), time(8, 6, 20), time(8, 13, 0),
+                          time(8, 13, 0), time(9, 43, 0), time(8, 25, 0), time(8, 31, 20), time(8, 29, 40),
+                          time(8, 29, 40), time(11, 44, 20), time(8, 23, 0), time(8, 8, 0), time(9, 59, 20),
+                          time(9, 59, 20), time(8, 47, 40), time(10, 38, 0), time(8, 50, 0), time(9, 13, 40),
+                          time(9, 45, 0), time(10, 28, 20), time(9, 30, 40), time(8, 13, 0), time(8, 47, 40),
+                          time(8, 38, 20), time(9, 4, 20), time(9, 8, 20), time(9, 15, 0), time(8, 37, 0)]
+
+
+class ShippedDayTest(unittest.TestCase):
+    # Runs the shipped day to the end of the day on the given hash table class and checks the report. O(n^3)
+    def check_shipped_day(self, table_type):
+        simulator = setup_simulator(time(17, 0), table_type=table_type)
+        simulator.simulate()
+        self.assertEqual(simulator.mile_tenths_driven(), 1155)
+        self.assertEqual(simulator.finish_time(), time(11, 44, 20))
+        delivery_times = [None] * len(SHIPPED_DELIVERY_TIMES)
+        for package in simulator.hub.all_packages.value_iterator():
+            self.assertTrue(package.on_time)
+            delivery_times[package.package_id - 1] = package.delivered_at
+        self.assertEqual(delivery_times, SHIPPED_DELIVERY_TIMES)
+
+    def test_hash_table(self):
+        self.check_shipped_day(HashTable)
+
+    def test_open_hash_table(self):
+        self.check_shipped_day(OpenHashTable)
+
+
+class ParseArgumentsTest(unittest.TestCase):
+    def test_rejects_counts_and_speeds_out_of_range(self):
+        for args in [["--speed", "0"], ["--speed", "-18"], ["--speed", "inf"], ["--trucks", "0"], ["--drivers", "0"],
+                     ["--capacity", "-1"], ["--clusters", "-1"]]:
+            with self.assertRaises(SystemExit):
+                parse_arguments(args)
+
+    def test_accepts_counts_and_speeds_in_range(self):
+        options = parse_arguments(["--speed", "0.5", "--trucks", "1", "--drivers", "1", "--capacity", "1",
+                                   "--clusters", "0"])
+        self.assertEqual((options.speed, options.trucks, options.drivers, options.capacity, options.clusters),
+                         (0.5, 1, 1, 1, 0))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,5 +1,26 @@
-from containers import HashTable
+from containers import new_table, using_table_type, DisjointSet, DistanceMatrix, HashTable, OpenHashTable
+from routing import nearest_neighbor_order, improve_route, cluster_locations, RoutePlan, NO_DEADLINE
+from events import EventSchedule, ReleasePackages, CorrectAddress, read_events, validate_events
+from history import DeliveryHistory
+from reporting import package_row, write_status
 from datetime import time, timedelta, datetime, date
+from bisect import bisect_left, insort
+from collections import deque
+from heapq import merge
+from enum import IntEnum
+import os
+import sys
+
+
+# The location, package, and event files shipped with the program, found next to this file rather than in the current
+# directory so that the program can be started from anywhere.
+DATA_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_LOCATIONS_PATH = os.path.join(DATA_DIRECTORY, "locations.csv")
+DEFAULT_PACKAGES_PATH = os.path.join(DATA_DIRECTORY, "packages.csv")
+DEFAULT_EVENTS_PATH = os.path.join(DATA_DIRECTORY, "events.csv")
+# Selects the shipped event file for the shipped packages and no events for any other package file, since the
+# shipped events refer to the shipped packages. See default_events_path.
+DEFAULT_EVENTS = "default"
 
 
 class Clock(object):
@@ -12,9 +33,9 @@ class Clock(object):
         self.current_datetime = datetime.combine(self.dummy_date, self.start_time)
         self.increment = increment
 
-    # Advances time by the set increment. O(1)
-    def advance_time(self):
-        self.current_datetime += self.increment
+    # Advances time by the given number of increments, one by default. O(1)
+    def advance_time(self, increments=1):
+        self.current_datetime += increments * self.increment
 
     # Returns current time on clock. O(1)
     def now(self):
@@ -24,16 +45,31 @@ class Clock(object):
     def time_after_increments(self, increments):
         return (self.current_datetime + (increments * self.increment)).time()
 
+    # Returns the greatest number of whole increments that can pass without the clock passing the given time
+    # of day. This is negative if that time has already passed. O(1)
+    def increments_before(self, time_of_day):
+        return (datetime.combine(self.dummy_date, time_of_day) - self.current_datetime) // self.increment
+
+    # Returns the number of whole increments that must pass before the clock reaches or passes the given
+    # time of day, or 0 if that time has already been reached. O(1)
+    def increments_until(self, time_of_day):
+        remaining = datetime.combine(self.dummy_date, time_of_day) - self.current_datetime
+        if remaining <= timedelta(0):
+            return 0
+        return -(-remaining // self.increment)
+
 
 class Location(object):
     # This class represents locations to which the trucks can drive and also holds
-    # address information for packages. Initializes in O(1).
+    # address information for packages. The distances are a DistanceMatrix shared by all
+    # locations, and each location keeps a view of its own row of it. Initializes in O(1).
     def __init__(self, location_id, address, city, zip_code, distances):
         self.location_id = location_id
         self.address = address
         self.city = city
         self.zip_code = zip_code
         self.distances = distances
+        self.distance_row = distances.row(location_id)
 
     # Part of the visitor pattern; when trucks arrive at a location they call this method and
     # most locations will in turn tell the truck to deliver packages. Calls the deliver method
@@ -42,11 +78,14 @@ class Location(object):
     def arrive(self, truck):
         truck.deliver()
 
-    # This method looks up the distance to the other location in the distance table. O(1)
+    # This method looks up the distance in miles to the other location in the distance table. O(1)
     def distance_to(self, other):
-        row = max(self.location_id, other.location_id)
-        col = min(self.location_id, other.location_id)
-        return self.distances[row][col]
+        return self.distance_row[other.location_id] / 10.0
+
+    # This method looks up the distance to the other location in tenths of a mile, which is the unit
+    # the trucks and the clock work in. O(1)
+    def tenths_to(self, other):
+        return self.distance_row[other.location_id]
 
 
 class Hub(Location):
@@ -55,42 +94,76 @@ class Hub(Location):
         super().__init__(location_id, address, city, zip_code, distances)
         self.all_packages = all_packages
         self.clock = clock
-        self.remaining_packages = HashTable()
-        self.priority_packages = HashTable()
-        self.delayed_packages = HashTable()
-        self.undeliverable_packages = HashTable()
-        self.truck2_only_packages = HashTable()
-        self.deliver_with = HashTable()
-        self.packages_by_location = HashTable()
-        self.packages_by_deadline = HashTable()
+        self.remaining_packages = new_table()
+        self.priority_packages = new_table()
+        self.delayed_packages = new_table()
+        self.undeliverable_packages = new_table()
+        self.truck2_only_packages = new_table()
+        # The group of packages which must be delivered together that each package belongs to. Packages without
+        # any such requirement are in a group of their own.
+        self.groups = new_table()
+        self.packages_by_location = new_table()
+        self.packages_by_deadline = new_table()
         self.deadlines = []
+        # The order packages were sorted in, and live indexes of the packages which are currently available
+        # for loading, kept separately for packages which any truck can take and packages for truck 2 only.
+        self.package_ranks = new_table()
+        self.eligible_packages = EligibilityIndex(self.package_ranks)
+        self.truck2_eligible_packages = EligibilityIndex(self.package_ranks)
+        # Every location on the network, keyed by its normalized address, city, and zip code.
+        self.locations_by_address = new_table()
+        # Settings for the optional route improvement stage run on every batch after fix_late_deliveries.
+        self.improve_routes = False
+        self.improvement_iterations = 100
+        self.improvement_seconds = 0.01
+        # A history.DeliveryHistory which records every change to a package, or None to run without one.
+        self.history = None
+        # Settings for fleet mode, in which the locations are split into cluster_count clusters of nearby
+        # locations when the packages are sorted and each truck loads from the cluster it is sent to instead of
+        # from every package at the hub. A cluster_count of 0 turns fleet mode off.
+        self.cluster_count = 0
+        self.clusters = []
+        self.location_clusters = new_table()
+        self.truck_clusters = new_table()
+        # The time each truck is expected back at the hub from the batch it loaded last in fleet mode.
+        self.truck_returns = new_table()
+        # Settings for dynamic dispatch, in which packages which become available during the day may be given
+        # to a truck already on the road, which picks them up on a return to the hub part way through its route.
+        # Packages which became available since the simulator last dispatched are kept in newly_available, and
+        # packages waiting at the hub for a truck are kept in reserved_packages with the truck.
+        self.dynamic_dispatch = False
+        self.newly_available = []
+        self.reserved_packages = new_table()
 
     # This method is called to set up package sorting information after the packages have been added
-    # to self.all_packages. Runs in O(n).
+    # to self.all_packages. The tables keyed by package are sized for the whole manifest first, so none of
+    # them resize while the packages are sorted. Runs in O(n).
     def sort_packages(self):
+        package_count = len(self.all_packages)
+        self.remaining_packages.bulk_load(self.all_packages)
+        for table in [self.package_ranks, self.groups, self.priority_packages, self.delayed_packages,
+                      self.undeliverable_packages, self.truck2_only_packages]:
+            table.reserve(package_count)
+        components = DisjointSet(package_count)
         for package in self.all_packages.value_iterator():
-            self.remaining_packages.add(package.package_id, package)
+            self.package_ranks.add(package.package_id, len(self.package_ranks))
             if package.deadline != "EOD":
                 self.priority_packages.add(package.package_id, package)
-            if package.status == "Delayed":
+            if package.state == PackageStatus.DELAYED:
                 self.delayed_packages.add(package.package_id, package)
-            if package.status == "Undeliverable":
+            if package.state == PackageStatus.UNDELIVERABLE:
                 self.undeliverable_packages.add(package.package_id, package)
             if package.truck2_only:
                 self.truck2_only_packages.add(package.package_id, package)
-            if package.package_id not in self.deliver_with:
-                self.deliver_with.add(package.package_id, [])
-            # This part is what allows the group_packages method to work. Each package that must be delivered
-            # with another package is indexed in both directions so that if the program tries loading either
-            # package, the other(s) will be included if there is room on the truck or the whole group will not
-            # be loaded if there is not room for all packages in the group or if there is a problem with any
-            # package in the group.
+            # Packages which must be delivered together are merged into one group, including packages which are
+            # only linked through other packages, so that if the program tries loading any package in the group,
+            # the others will be included if there is room on the truck or the whole group will not be loaded if
+            # there is not room for all packages in the group or if there is a problem with any package in it.
+            components.add(package.package_id)
             for other_package_id in package.deliver_with:
-                if other_package_id in self.deliver_with:
-                    self.deliver_with[other_package_id].append(package)
-                else:
-                    self.deliver_with.add(other_package_id, [package])
-                self.deliver_with[package.package_id].append(self.all_packages[other_package_id])
+                if other_package_id not in self.all_packages:
+                    raise KeyError(other_package_id)
+                components.union(package.package_id, other_package_id)
             location = package.delivery_location
             if location.location_id in self.packages_by_location:
                 self.packages_by_location[location.location_id].append(package)
@@ -104,13 +177,329 @@ class Hub(Location):
                 self.packages_by_deadline[package.deadline_time] = [package]
                 self.deadlines.append(package.deadline_time)
                 self.deadlines.sort()
+        for package in self.all_packages.value_iterator():
+            root = components.find(package.package_id)
+            if root not in self.groups:
+                self.groups.add(root, PackageGroup())
+            group = self.groups[root]
+            group.add(package)
+            self.groups.add(package.package_id, group)
+        if self.cluster_count > 0:
+            self.build_clusters()
+        for package in self.all_packages.value_iterator():
+            if package.state == PackageStatus.AT_HUB:
+                self.index_package(package)
+
+    # Records the current state of a package in the history, if one is being kept. O(1) amortized
+    def record(self, package):
+        if self.history is not None:
+            self.history.record_package(package)
+
+    # Adds a package which has become available for loading to the index for the trucks which can take it, which
+    # in fleet mode is the index of the cluster its delivery location is in, and counts it as available in its
+    # group. O(log n) to find its place in the index, plus the time to shift the packages after it.
+    def index_package(self, package):
+        self.groups[package.package_id].available += 1
+        if self.cluster_count > 0:
+            indexes = self.location_clusters[package.delivery_location.location_id]
+        else:
+            indexes = self
+        if package.truck2_only:
+            indexes.truck2_eligible_packages.add(package)
+        else:
+            indexes.eligible_packages.add(package)
+
+    # Removes a package which has been loaded from the index it was in. Same time complexity as index_package.
+    def unindex_package(self, package):
+        self.groups[package.package_id].available -= 1
+        if self.cluster_count > 0:
+            indexes = self.location_clusters[package.delivery_location.location_id]
+        else:
+            indexes = self
+        if package.truck2_only:
+            indexes.truck2_eligible_packages.remove(package)
+        else:
+            indexes.eligible_packages.remove(package)
+
+    # Splits every location except the hub into cluster_count clusters of nearby locations with
+    # routing.cluster_locations, and orders the other clusters of each one from nearest to farthest. O(kn) where
+    # k is the number of clusters and n is the number of locations, plus O(k^2 log k) to order the clusters.
+    def build_clusters(self):
+        location_ids = [i for i in range(len(self.distances)) if i != self.location_id]
+        centers, members = cluster_locations(self.distances, location_ids, self.cluster_count, self.location_id)
+        self.clusters = []
+        for i in range(len(centers)):
+            cluster = LocationCluster(i, centers[i], self.package_ranks)
+            self.clusters.append(cluster)
+            for location_id in members[i]:
+                self.location_clusters.add(location_id, cluster)
+        for cluster in self.clusters:
+            center_row = self.distances.row(cluster.center)
+            cluster.neighbors = sorted(self.clusters, key=lambda other: (center_row[other.center], other.cluster_id))
+
+    # Sends the truck to the cluster it will load from next, releasing the cluster it served before, and returns
+    # it, or None if no cluster has packages the truck can take. Clusters with the earliest deadline among their
+    # packages come first, then those which fewer trucks are serving, then those with the most packages. O(kd)
+    # where k is the number of clusters and d is the number of deadlines.
+    def assign_cluster(self, truck):
+        previous = self.truck_clusters.pop(truck.truck_id)
+        if previous is not None:
+            previous.trucks -= 1
+        best = None
+        best_key = None
+        for cluster in self.clusters:
+            deadline = cluster.earliest_deadline(self.deadlines, truck.truck_id)
+            if deadline is None:
+                continue
+            key = (deadline, cluster.trucks, -cluster.available(truck.truck_id))
+            if best is None or key < best_key:
+                best = cluster
+                best_key = key
+        if best is not None:
+            best.trucks += 1
+            self.truck_clusters.add(truck.truck_id, best)
+        return best
+
+    # Returns the packages the truck will choose its batch from in fleet mode: those in its assigned cluster in
+    # the order given by highest_priority_packages, followed by those in the nearest other clusters only until
+    # there are enough packages to fill the truck. Same time complexity as highest_priority_packages for the
+    # clusters used.
+    def cluster_packages(self, truck):
+        cluster = self.assign_cluster(truck)
+        packages = []
+        if cluster is None:
+            return packages
+        for neighbor in cluster.neighbors:
+            if len(packages) >= truck.capacity:
+                break
+            packages.extend(self.highest_priority_packages(truck.truck_id,
+                                                           neighbor.eligibility_indexes(truck.truck_id)))
+        return packages
+
+    # Returns the packages the truck can choose its batch from when the batch from its own cluster would miss a
+    # deadline: the packages with the earliest deadline from every cluster, from the nearest cluster to the
+    # farthest, then those with the next deadline, and so on until there are enough to fill the truck. The loops
+    # visit each cluster once per deadline, and each group of packages merged is sorted by location, so this
+    # runs in O(kd + n^2) where k is the number of clusters, d the number of deadlines, and n the number of
+    # eligible packages.
+    def cluster_packages_by_deadline(self, truck):
+        cluster = self.truck_clusters[truck.truck_id]
+        packages = []
+        last_location = self
+        for deadline in self.deadlines:
+            for neighbor in cluster.neighbors:
+                if len(packages) >= truck.capacity:
+                    return packages
+                indexes = neighbor.eligibility_indexes(truck.truck_id)
+                deadline_packages = list(merge(*[index.packages_due(deadline) for index in indexes],
+                                               key=self.package_rank))
+                for package in sort_by_location(deadline_packages, last_location):
+                    packages.append(package)
+                    last_location = package.delivery_location
+        return packages
+
+    # Adds a location to the address index. O(1)
+    def index_location(self, location):
+        self.locations_by_address.add(normalize_address(location.address, location.city, location.zip_code),
+                                      location)
+
+    # Returns the location with the given address, city, and zip code, or None if there is no such location on
+    # the network. O(1)
+    def find_location(self, address, city, zip_code):
+        key = normalize_address(address, city, zip_code)
+        if key in self.locations_by_address:
+            return self.locations_by_address[key]
+        return None
+
+    # Returns the indexes of packages which the given truck is allowed to take. O(1)
+    def eligibility_indexes(self, truck_id):
+        if truck_id == 2:
+            return [self.eligible_packages, self.truck2_eligible_packages]
+        return [self.eligible_packages]
+
+    # Marks delayed packages as having arrived at the hub and makes them available for loading. package_ids is a
+    # list of the packages which arrived, or None when every delayed package arrived. IDs of packages which are
+    # not delayed are ignored. O(n) where n is the number of packages released.
+    def release_delayed_packages(self, package_ids=None):
+        if package_ids is None:
+            for package in self.delayed_packages.value_iterator():
+                package.state = PackageStatus.AT_HUB
+                self.index_package(package)
+                self.record(package)
+                self.made_available(package)
+            self.delayed_packages = new_table()
+            return
+        for package_id in package_ids:
+            package = self.delayed_packages.pop(package_id)
+            if package is not None:
+                package.state = PackageStatus.AT_HUB
+                self.index_package(package)
+                self.record(package)
+                self.made_available(package)
+
+    # Updates the delivery location of a package which has not left the hub and moves it to the packages for its
+    # new location. An undeliverable package becomes available for loading, while a delayed package stays
+    # delayed until it is released. O(n) where n is the number of packages at its old location, plus the time
+    # to index the package.
+    def correct_address(self, package, location):
+        self.packages_by_location[package.delivery_location.location_id].remove(package)
+        if location.location_id in self.packages_by_location:
+            self.packages_by_location[location.location_id].append(package)
+        else:
+            self.packages_by_location.add(location.location_id, [package])
+        eligible = package.state == PackageStatus.AT_HUB
+        if eligible:
+            self.unindex_package(package)
+        package.delivery_location = location
+        if package.state == PackageStatus.UNDELIVERABLE:
+            package.state = PackageStatus.AT_HUB
+            self.undeliverable_packages.remove(package.package_id)
+            eligible = True
+        if eligible:
+            self.index_package(package)
+            self.made_available(package)
+        self.record(package)
+
+    # Notes that a package has become available for loading during the day, so that the simulator can offer it
+    # to the trucks on the road when dynamic dispatch is on. O(1)
+    def made_available(self, package):
+        if self.dynamic_dispatch:
+            self.newly_available.append(package)
+
+    # Estimates how much distance a package adds if it is left at the hub for the next truck to load. That is a
+    # trip from the hub and back if it is the only package waiting, but otherwise it can go in the same load as
+    # the package waiting nearest to it, and costs at most the detour there and back from that package's stop.
+    # O(n) in the number of packages left to deliver.
+    def hub_delivery_cost(self, package):
+        location = package.delivery_location
+        cost = self.tenths_to(location) + location.tenths_to(self)
+        for other in self.remaining_packages.value_iterator():
+            if other is not package and other.state == PackageStatus.AT_HUB:
+                cost = min(cost, 2 * other.delivery_location.tenths_to(location))
+        return cost
+
+    # Returns a RoutePlan for the rest of a truck's route after its current destination, ending with the drive
+    # back to the hub, or None if the truck is not on the way to a stop. The plan starts at the destination, so
+    # each stop's budget is reduced by the distance still to drive to get there, and stops which are only
+    # waiting for packages reserved for the truck take their budget from those packages. O(n) in the number of
+    # packages on the truck.
+    def truck_route_plan(self, truck):
+        stops = list(truck.manifest.stops)
+        if len(stops) == 0 or stops[0] is not truck.destination:
+            return None
+        offset = truck.mile_tenths_to_destination
+        budgets = new_table()
+        for package in list(truck.manifest) + truck.reserved:
+            location_id = package.delivery_location.location_id
+            budget = self.clock.increments_before(package.deadline_time) - offset
+            if location_id not in budgets or budget < budgets[location_id]:
+                budgets[location_id] = budget
+        route = [location.location_id for location in stops[1:]] + [self.location_id]
+        route_budgets = [budgets[location_id] if location_id in budgets else NO_DEADLINE for location_id in route]
+        return RoutePlan(self.distances, truck.destination.location_id, route, route_budgets)
+
+    # Finds the cheapest way for a truck on the road to deliver a package which is waiting at the hub, using
+    # cheapest insertion on the rest of its route. If the truck already has a stop at the hub to pick up other
+    # packages, only the package's own stop is inserted after it. Otherwise the stop at the hub is tried at
+    # every position, each followed by the cheapest position for the package after it. A package going to a
+    # location already on the route after the stop at the hub adds no stop of its own. Every stop on the route
+    # must still be reached by its deadline. Returns the added distance in tenths of a mile with the plan
+    # positions of the stops to insert at the hub and the package's location, either of which is None when that
+    # stop is already on the route, or None if the truck cannot take the package. O(n^2) in the number of stops,
+    # since each position of the stop at the hub needs a new route plan.
+    def insertion_for(self, truck, package):
+        plan = self.truck_route_plan(truck)
+        if plan is None:
+            return None
+        location_id = package.delivery_location.location_id
+        if location_id == plan.start:
+            return None
+        budget = self.clock.increments_before(package.deadline_time) - truck.mile_tenths_to_destination
+        end = len(plan) - 1
+        route = plan.stops[:end]
+        pickup = -1 if plan.start == self.location_id else (route.index(self.location_id)
+                                                            if self.location_id in route else None)
+        existing = route.index(location_id) if location_id in route else None
+        if pickup is not None:
+            if existing is None:
+                best = plan.cheapest_insertion(location_id, budget, pickup + 1, end)
+                return None if best is None else (best[1], None, best[0])
+            if existing > pickup and plan.arrivals[existing] <= budget:
+                return 0, None, None
+            return None
+        best = None
+        for position in range(end):
+            if existing is not None and existing < position:
+                break
+            if not plan.can_insert(self.location_id, NO_DEADLINE, position):
+                continue
+            delay = plan.insertion_delay(self.location_id, position)
+            with_pickup = RoutePlan(self.distances, plan.start, route[:position] + [self.location_id] +
+                                    plan.stops[position:], plan.budgets[:position] + [NO_DEADLINE] +
+                                    plan.budgets[position:])
+            if existing is None:
+                insertion = with_pickup.cheapest_insertion(location_id, budget, position + 1, end + 1)
+                if insertion is None:
+                    continue
+                candidate = (delay + insertion[1], position, insertion[0])
+            elif with_pickup.arrivals[existing + 1] <= budget:
+                candidate = (delay, position, None)
+            else:
+                continue
+            if best is None or candidate[0] < best[0]:
+                best = candidate
+        return best
+
+    # Reserves a package for a truck on the road, adding the stops chosen by insertion_for to its route. The
+    # package stays at the hub until the truck picks it up, but is no longer available to other trucks. O(n) in
+    # the number of stops.
+    def reserve(self, package, truck, pickup_position, package_position):
+        # Positions in the plan from truck_route_plan are one less than in the manifest, which starts with the
+        # truck's current destination.
+        if pickup_position is not None:
+            truck.manifest.add_stop(self, pickup_position + 1)
+        if package_position is not None:
+            truck.manifest.add_stop(package.delivery_location, package_position + 1)
+        truck.reserved.append(package)
+        self.reserved_packages.add(package.package_id, truck)
+        self.remaining_packages.remove(package.package_id)
+        self.unindex_package(package)
+        if package.package_id in self.priority_packages:
+            self.priority_packages.remove(package.package_id)
+
+    # Returns a reserved package to the hub's available packages and takes the stops which were only there for
+    # it off the truck's route. O(n) in the number of stops.
+    def cancel_reservation(self, package):
+        truck = self.reserved_packages.pop(package.package_id)
+        truck.reserved.remove(package)
+        location = package.delivery_location
+        if location not in [other.delivery_location for other in truck.reserved]:
+            truck.manifest.remove_stop(location)
+        if len(truck.reserved) == 0 and truck.destination is not self:
+            truck.manifest.remove_stop(self)
+        self.restore_package(package)
+
+    # Makes a package which was taken for a batch or reserved for a truck available for loading again. This
+    # undoes add_to_batch. Same time complexity as index_package.
+    def restore_package(self, package):
+        self.remaining_packages.add(package.package_id, package)
+        if package.deadline != "EOD":
+            self.priority_packages.add(package.package_id, package)
+        self.index_package(package)
 
     # Part of the visitor pattern; when trucks arrive at a location they call this method on it.
     # For most locations this prompts the trucks to deliver packages, but when arriving at the hub
-    # the next batch of packages is loaded instead. The loop runs in O(n), but determining the packages
-    # in the list is the real bottleneck of this method and it runs before the loop, therefore the method
-    # has the same time complexity as self.next_batch(), which is O(n^3).
+    # the next batch of packages is loaded instead, unless the truck has returned for reserved packages.
+    # The loop runs in O(n), but determining the packages in the list is the real bottleneck of this
+    # method and it runs before the loop, therefore the method has the same time complexity as
+    # self.next_batch(), which is O(n^3).
     def arrive(self, truck):
+        # A stop at the hub in the manifest is a return part way through the route to pick up reserved packages.
+        if self.location_id in truck.manifest.buckets:
+            for package in truck.reserved:
+                self.reserved_packages.remove(package.package_id)
+            truck.pick_up()
+            return
         next_batch = self.next_batch(truck)
         if len(next_batch) == 0:
             truck.wait_at_hub()
@@ -119,7 +508,7 @@ class Hub(Location):
 
     # Selects the next batch of packages to be loaded onto the given truck. First, a list of all packages
     # eligible to be in the batch is retrieved, sorted first by deadline then by nearest next delivery, an
-    # operation that runs in O(n^2). Then, add_grouped_packages, which runs in O(n^2) relative to the size of
+    # operation that runs in O(n^2). Then, add_grouped_packages, which runs in O(n) relative to the size of
     # the group, is called until the truck is at capacity or the list of eligible packages is exhausted. As
     # part of that method call, any additional packages going to the same location as one of the packages in
     # each group will be passed recursively to the add_grouped_packages method, but this does not increase the
@@ -129,14 +518,60 @@ class Hub(Location):
     # Since looping through the packages is O(n) and each iteration is O(n^2), this puts the final time complexity
     # at O(n^3), but it is worth noting that larger groups (the n^2) will likely result in fewer iterations as
     # they load the truck to capacity faster.
+    # In fleet mode the batch comes from the truck's cluster, unless that batch would deliver a package late or
+    # keep every truck out too long to meet a delayed package's deadline, in which case the packages go back to
+    # the hub and the batch is chosen from every cluster as it is outside fleet mode.
     def next_batch(self, truck):
+        if self.cluster_count > 0:
+            packages = self.fill_batch(self.cluster_packages(truck), truck)
+            plan = self.route_plan(packages)
+            if not plan.is_feasible() or not self.returns_in_time(truck, plan.length(return_to_start=True)):
+                for package in packages:
+                    self.restore_package(package)
+                packages = self.fill_batch(self.cluster_packages_by_deadline(truck), truck)
+                plan = self.route_plan(packages)
+            self.truck_returns.add(truck.truck_id, self.clock.current_datetime +
+                                   plan.length(return_to_start=True) * self.clock.increment)
+        else:
+            packages = self.fill_batch(self.highest_priority_packages(truck.truck_id), truck)
+        if self.improve_routes:
+            packages = self.improve_batch_route(packages)
+        return packages
+
+    # Takes packages for a batch from the candidates in order, with the packages which must go with them, until
+    # the truck is full, and orders them so that as few as possible are late. See next_batch. O(n^3)
+    def fill_batch(self, candidates, truck):
         packages = []
-        for priority_package in self.highest_priority_packages(truck.truck_id):
+        for priority_package in candidates:
             self.add_grouped_packages(priority_package, packages, truck)
             if len(packages) == truck.capacity:
                 break
         return self.fix_late_deliveries(packages)
 
+    # Shortens the route for a batch of packages with improve_route while keeping every deadline which
+    # has_late_delivery checks. The packages are grouped by delivery location since the truck delivers all
+    # packages at a location on its first visit there, and each location's budget is the number of tenths of
+    # a mile which can be driven before its earliest deadline passes. Grouping is O(n) and the improvement is
+    # limited by the iteration cap and time limit set on the hub.
+    def improve_batch_route(self, packages):
+        packages_at = group_by_location(packages)
+        budgets = new_table()
+        stops = []
+        for package in packages:
+            location_id = package.delivery_location.location_id
+            budget = self.clock.increments_before(package.deadline_time)
+            if location_id not in budgets:
+                stops.append(location_id)
+                budgets.add(location_id, budget)
+            elif budget < budgets[location_id]:
+                budgets[location_id] = budget
+        route = improve_route(self.distances, self.location_id, stops, budgets,
+                              self.improvement_iterations, self.improvement_seconds)
+        improved_packages = []
+        for location_id in route:
+            improved_packages.extend(packages_at[location_id])
+        return improved_packages
+
     # Attempts to order packages by shortest path and checks if route will result in late deliveries, in
     # which case the packages with earlier deadlines are left near the beginning of the list. O(n^2) due
     # to use of sort_by_location method.
@@ -156,35 +591,89 @@ class Hub(Location):
                     packages_to_reorder.append(packages[i])
             for package in sort_by_location(packages_to_reorder, packages[last_priority_index].delivery_location):
                 on_time_packages.append(package)
+            if self.has_late_delivery(on_time_packages):
+                on_time_packages = self.repair_late_deliveries(on_time_packages)
         return on_time_packages
 
-    # Searches through package list while tracking mileage looking for late deliveries. Runs in O(n).
+    # Returns a RoutePlan which delivers the packages in the given order, with one stop per package, starting
+    # now from the hub. Each stop's budget is the number of increments left before the package's deadline. O(n)
+    def route_plan(self, packages):
+        stops = [package.delivery_location.location_id for package in packages]
+        budgets = [self.clock.increments_before(package.deadline_time) for package in packages]
+        return RoutePlan(self.distances, self.location_id, stops, budgets)
+
+    # Returns the greatest distance a truck can drive from now before it is back at the hub in time to take any
+    # delayed package it is allowed to carry straight to its delivery location by its deadline, or NO_DEADLINE
+    # if there is no such package which can still be delivered on time. O(n) in the number of delayed packages.
+    def return_budget(self, truck):
+        budget = NO_DEADLINE
+        for package in self.delayed_packages.value_iterator():
+            if package.deadline != "EOD" and (not package.truck2_only or truck.truck_id == 2):
+                package_budget = (self.clock.increments_before(package.deadline_time) -
+                                  self.tenths_to(package.delivery_location))
+                if 0 <= package_budget < budget:
+                    budget = package_budget
+        return budget
+
+    # Returns True if a truck which will drive the given distance before it is back at the hub, or another truck
+    # expected back before then, returns in time for the delayed packages with deadlines. See return_budget. O(n)
+    # in the number of delayed packages plus the number of trucks.
+    def returns_in_time(self, truck, distance):
+        budget = self.return_budget(truck)
+        if distance <= budget:
+            return True
+        latest = self.clock.current_datetime + budget * self.clock.increment
+        for truck_id, returns_at in self.truck_returns:
+            if truck_id != truck.truck_id and returns_at <= latest:
+                return True
+        return False
+
+    # Tests whether delivering the packages in the given order starting now would miss any deadline. Runs in
+    # O(n) to build the route plan and check its slack.
     def has_late_delivery(self, packages):
-        total_distance = 0
-        last_location = self
-        late = False
-        for package in packages:
-            location = package.delivery_location
-            total_distance += int(10 * location.distance_to(last_location))
-            last_location = location
-            if self.clock.time_after_increments(total_distance) > package.deadline_time:
-                late = True
+        return not self.route_plan(packages).is_feasible()
+
+    # Moves packages which would be delivered late earlier in the order. Each late package, starting with the
+    # first, is taken out of the route and put back at the position before it where it adds the least distance
+    # while it and every package between there and its old position are still delivered on time. The route plan
+    # checks each position in O(1). Repair stops at the first late package which cannot be moved, and the
+    # original order is kept unless fewer packages end up late. Each package moved costs O(n log n) to update
+    # the route plan and its sparse table, so this is O(n^2 log n) at worst.
+    def repair_late_deliveries(self, packages):
+        plan = self.route_plan(packages)
+        repaired = list(packages)
+        late_count = len([slack for slack in plan.slack if slack < 0])
+        position = plan.first_late()
+        while position is not None:
+            index, budget = plan.remove(position)
+            best = None
+            for new_position in range(position):
+                if plan.can_insert(index, budget, new_position, position - 1):
+                    delay = plan.insertion_delay(index, new_position)
+                    if best is None or delay < best[1]:
+                        best = (new_position, delay)
+            if best is None:
+                plan.insert(index, budget, position)
                 break
-        return late
+            plan.insert(index, budget, best[0])
+            repaired.insert(best[0], repaired.pop(position))
+            position = plan.first_late(position + 1)
+        if len([slack for slack in plan.slack if slack < 0]) < late_count:
+            return repaired
+        return packages
 
     # This method adds packages first from any group which must be delivered together per requirements,
     # then attempts to add any remaining packages with the same address as a package from the group.
-    # Runs in O(n^2) worst case for the base algorithm, but recursive calls can add some complexity.
-    # See notes on next_batch() for more detail on the effects of this recursion.
+    # The group was found when the packages were sorted and knows whether all of its packages are available,
+    # so checking it is O(1) and the base algorithm runs in O(n) in the size of the group, but recursive calls
+    # can add some complexity. See notes on next_batch() for more detail on the effects of this recursion.
     def add_grouped_packages(self, first_package, batch, truck):
-        group = HashTable()
-        # O(n^2) method call
-        is_eligible = self.group_packages(first_package, group, truck.truck_id)
-        if is_eligible and len(group) + len(batch) <= truck.capacity:
+        group = self.groups[first_package.package_id]
+        if group.is_eligible(truck.truck_id) and len(group) + len(batch) <= truck.capacity:
             # O(n) loop
-            for package in group.value_iterator():
+            for package in group.packages.value_iterator():
                 self.add_to_batch(package, batch, truck)
-            self.add_packages_by_locations(package_locations(group.value_iterator()), batch, truck)
+            self.add_packages_by_locations(package_locations(group.packages.value_iterator()), batch, truck)
 
     # This method adds any eligible packages from a HashTable of locations and breaks early if the truck is full.
     # Although it may appear that this is O(n^2) because of nested loops, the actual time complexity of this
@@ -215,25 +704,10 @@ class Hub(Location):
         if len(batch) < truck.capacity and self.is_eligible_package(package, truck.truck_id):
             batch.append(package)
             self.remaining_packages.remove(package.package_id)
+            self.unindex_package(package)
             if package.package_id in self.priority_packages:
                 self.priority_packages.remove(package.package_id)
 
-    # This method recursively adds all packages that must be delivered together (per special instructions,
-    # not necessarily packages with the same address) into the provided HashTable. Since it is a HashTable,
-    # testing with "not in" is O(1) and when the condition is False it aborts that iteration immediately.
-    # Adding to the HashTable is also O(1). The initial condition will pass exactly n times where n is the
-    # final size of the group as long as it is not cut short by one of the packages in the group being ineligible,
-    # so the best case runs in linear time. However, the absolute worst case would be if each of the n packages
-    # specifically lists each of the n-1 other packages in its requirements, causing an n-1 loop to run n times.
-    # n(n-1) is n^2 - n, or O(n^2).
-    def group_packages(self, package, hash_group, truck_id):
-        is_eligible = self.is_eligible_package(package, truck_id)
-        if is_eligible and package.package_id not in hash_group:
-            hash_group.add(package.package_id, package)
-            for other_package in self.deliver_with[package.package_id]:
-                is_eligible = is_eligible and self.group_packages(other_package, hash_group, truck_id)
-        return is_eligible
-
     # This method tests whether a given package is eligible to be loaded onto a given truck.
     # All tests using in are done with HashTables, therefore this runs in O(1).
     def is_eligible_package(self, package, truck_id):
@@ -247,61 +721,166 @@ class Hub(Location):
     # deadline time, then approximately in order of the nearest next delivery location. The last package
     # in each deadline group is preserved as the starting location for the next round to promote clustering
     # packages with nearby delivery locations while also giving priority to packages with the earliest
-    # deadlines. The outer loop and the first inner loop actually combine for O(n) runtime because the number
-    # of packages in each deadline varies, but the operations scale only by the number of total packages.
-    # The second inner loop also runs in O(n), but first it sorts the eligible packages by location, which is
-    # O(n^2). That makes the entire method O(n^2).
-    def highest_priority_packages(self, truck_id):
+    # deadlines. The eligible packages for each deadline come straight from the truck's eligibility indexes,
+    # so packages which were already loaded or are not yet available are never visited. Merging the indexes
+    # is O(n) in the number of eligible packages, but each group is then sorted by location, which is O(n^2).
+    # That makes the entire method O(n^2) in the number of eligible packages. Other indexes, such as those of a
+    # cluster in fleet mode, can be given to choose from their packages instead.
+    def highest_priority_packages(self, truck_id, indexes=None):
         packages = []
         last_location = self
+        if indexes is None:
+            indexes = self.eligibility_indexes(truck_id)
         for deadline in self.deadlines:
-            deadline_packages = []
-            for package in self.packages_by_deadline[deadline]:
-                if self.is_eligible_package(package, truck_id):
-                    deadline_packages.append(package)
+            if len(indexes) == 1:
+                deadline_packages = indexes[0].packages_due(deadline)
+            else:
+                deadline_packages = list(merge(*[index.packages_due(deadline) for index in indexes],
+                                               key=self.package_rank))
             for package in sort_by_location(deadline_packages, last_location):
                 packages.append(package)
                 last_location = package.delivery_location
         return packages
 
+    # Returns the position of a package in the order the hub sorted them. O(1)
+    def package_rank(self, package):
+        return self.package_ranks[package.package_id]
+
+
+class LocationCluster(object):
+    # This class represents a cluster of nearby locations in fleet mode, with its own indexes of the packages
+    # which are available for loading and are going to its locations, and the number of trucks serving it.
+    # neighbors holds every cluster, this one first, from nearest to farthest. Initializes in O(1)
+    def __init__(self, cluster_id, center, ranks):
+        self.cluster_id = cluster_id
+        self.center = center
+        self.eligible_packages = EligibilityIndex(ranks)
+        self.truck2_eligible_packages = EligibilityIndex(ranks)
+        self.trucks = 0
+        self.neighbors = [self]
+
+    # Returns the indexes of packages in this cluster which the given truck is allowed to take. O(1)
+    def eligibility_indexes(self, truck_id):
+        if truck_id == 2:
+            return [self.eligible_packages, self.truck2_eligible_packages]
+        return [self.eligible_packages]
+
+    # Returns the number of packages in this cluster which the given truck is allowed to take. O(1)
+    def available(self, truck_id):
+        return sum([len(index) for index in self.eligibility_indexes(truck_id)])
+
+    # Returns the earliest of the given deadlines, in ascending order, which a package in this cluster that the
+    # given truck is allowed to take is due by, or None if there are no such packages. O(d) in the number of
+    # deadlines.
+    def earliest_deadline(self, deadlines, truck_id):
+        indexes = self.eligibility_indexes(truck_id)
+        if sum([len(index) for index in indexes]) == 0:
+            return None
+        for deadline in deadlines:
+            for index in indexes:
+                if len(index.packages_due(deadline)) != 0:
+                    return deadline
+        return None
+
+
+class PackageGroup(object):
+    # This class holds packages which must be delivered together (per special instructions, not necessarily
+    # packages with the same address), with a count of how many of them are available for loading, which the hub
+    # keeps up to date as packages are indexed and unindexed. Initializes in O(1)
+    def __init__(self):
+        # Always a HashTable rather than new_table(), since the order of the group decides which of its
+        # locations is loaded first, and that must not depend on the table class chosen for the run.
+        self.packages = HashTable()
+        self.available = 0
+        self.truck2_only = False
+
+    # Allows len() function to take this object as an argument. Returns the number of packages. O(1)
+    def __len__(self):
+        return len(self.packages)
+
+    # Adds a package to the group. The whole group can only go on truck 2 if any of its packages can. O(1)
+    def add(self, package):
+        self.packages.add(package.package_id, package)
+        self.truck2_only = self.truck2_only or package.truck2_only
+
+    # Returns True if every package in the group is available for loading onto the given truck. O(1)
+    def is_eligible(self, truck_id):
+        return self.available == len(self.packages) and (not self.truck2_only or truck_id == 2)
+
+
+class EligibilityIndex(object):
+    # This class keeps the packages which are available for loading grouped by deadline, with each group in the
+    # order given by the ranks HashTable, so that packages can be added and removed as their status changes
+    # instead of filtering every package whenever a batch is selected. Initializes in O(1)
+    def __init__(self, ranks):
+        self.ranks = ranks
+        self.packages_by_deadline = new_table()
+        self.len = 0
+
+    # Allows len() function to take this object as an argument. O(1)
+    def __len__(self):
+        return self.len
+
+    # Returns the position of a package in the ranked order. O(1)
+    def rank(self, package):
+        return self.ranks[package.package_id]
+
+    # Adds a package to the group for its deadline. Finding its place is O(log n) by binary search and
+    # inserting it shifts the packages after it in the group.
+    def add(self, package):
+        if package.deadline_time not in self.packages_by_deadline:
+            self.packages_by_deadline.add(package.deadline_time, [])
+        insort(self.packages_by_deadline[package.deadline_time], package, key=self.rank)
+        self.len += 1
+
+    # Removes a package from the group for its deadline if it is present. Same time complexity as add.
+    def remove(self, package):
+        if package.deadline_time in self.packages_by_deadline:
+            group = self.packages_by_deadline[package.deadline_time]
+            i = bisect_left(group, self.rank(package), key=self.rank)
+            if i < len(group) and group[i] is package:
+                del group[i]
+                self.len -= 1
+
+    # Returns the packages with the given deadline in ranked order. O(1)
+    def packages_due(self, deadline):
+        if deadline in self.packages_by_deadline:
+            return self.packages_by_deadline[deadline]
+        return []
+
 
 # This method returns a list of the given packages in order by delivery location matching the
-# location order returned by the shortest path method. That method is O(n^2) but runs only once
-# in this method. These locations are iterated first because there may be more than one package
-# for each location, resulting in fewer iterations of the package list. However, in the worst case
-# the number of locations is equal to the number of packages, causing n^2 iterations. Therefore,
-# shortest path's O(n^2) + n^2 iterations is still O(n^2).
+# location order returned by nearest_neighbor_order. The packages are bucketed by location in a single
+# pass, so each package is touched once regardless of how many locations there are. The bucketing and
+# the final concatenation are O(n), and finding the location order is O(n^2), so this is O(n^2) overall.
 def sort_by_location(packages, starting_location):
+    packages_at = group_by_location(packages)
     sorted_packages = []
-    for location in shortest_path(package_locations(packages), starting_location):
-        for package in packages:
-            if package.delivery_location == location:
-                sorted_packages.append(package)
+    for location_id in nearest_neighbor_order(starting_location.distances, packages_at.key_iterator(),
+                                              starting_location.location_id):
+        sorted_packages.extend(packages_at[location_id])
     return sorted_packages
 
 
-# This method will take a HashTable of locations and find the shortest distance from the
-# starting point (the hub), then find the shortest distance from that location to the remaining locations,
-# and so on until all locations have been visited. The while loop runs n times and the inner for loop runs
-# at most n times. Therefore, it runs in O(n^2).
-def shortest_path(locations, starting_location):
-    sorted_locations = []
-    last_location = starting_location
-    while len(locations) != 0:
-        next_location = None
-        shortest_distance = 9999.9
-        for location in locations.value_iterator():
-            if last_location.distance_to(location) < shortest_distance:
-                shortest_distance = last_location.distance_to(location)
-                next_location = location
-        locations.remove(next_location.location_id)
-        sorted_locations.append(next_location)
-        last_location = next_location
-    return sorted_locations
+# This method groups packages into lists keyed by the ID of their delivery location. The keys are added
+# in the same order as package_locations would add them, and each list keeps the packages in their
+# original order. Runs in O(n).
+def group_by_location(packages):
+    # Always a HashTable, since nearest_neighbor_order breaks ties between locations at the same distance by
+    # the order of its keys, and the routes must not depend on the table class chosen for the run.
+    packages_at = HashTable()
+    for package in packages:
+        location_id = package.delivery_location.location_id
+        if location_id in packages_at:
+            packages_at[location_id].append(package)
+        else:
+            packages_at.add(location_id, [package])
+    return packages_at
 
 
 # This method extracts package delivery locations into a HashTable, which prevents duplicates from
-# being added. Runs in O(n).
+# being added. It is always a HashTable so that the locations come out in the same order whichever table
+# class is chosen for the run. Runs in O(n).
 def package_locations(packages):
     locations = HashTable()
     for package in packages:
@@ -311,34 +890,144 @@ def package_locations(packages):
 
 
 class Simulator(object):
-    # This class contains the main control elements to simulate the day's deliveries. Initializes in O(1)
-    def __init__(self, hub, trucks, clock, locations, stop_at):
+    # This class contains the main control elements to simulate the day's deliveries. Only the first
+    # driver_count trucks are sent out, since each needs a driver. Initializes in O(1)
+    def __init__(self, hub, trucks, clock, locations, stop_at, driver_count=2, events=()):
         self.hub = hub
         self.trucks = trucks
         self.clock = clock
         self.locations = locations
         self.stop_at = stop_at
+        self.driver_count = driver_count
+        # An instrumentation.Profiler which times the hot paths of simulate, or None to run without one.
+        self.profiler = None
+        # The hash table class the simulation runs on, such as containers.OpenHashTable, or None for the class
+        # selected in the containers module. It is only selected while the simulation runs; see profiled.
+        self.table_type = None
+        # A history.DeliveryHistory which records the day so that status_at can report any earlier time, or None
+        # to run without one. It is shared with the hub, which records the packages as they change.
+        self.history = None
+        # Events which have not happened yet, such as those read by events.read_events, ordered by time so that
+        # only the next one is ever looked at and events which already happened are gone.
+        self.schedule = EventSchedule(events)
 
     # Main control loop goes here. As such, the time complexity is technically the same as the entire
     # program, which would be O(n^3). Apart from the "while not finished" loop, this method runs in O(n)
-    # based on the number of trucks.
-    def run(self):
+    # based on the number of trucks. Rather than stepping through every 20 second increment of the day,
+    # the loop jumps directly to the next increment in which something can happen, so the number of
+    # iterations depends on the number of arrivals and events instead of the length of the day.
+    # The final state is reported in the given format, a table by default, to the given stream, which is
+    # standard output by default. See reporting.write_status.
+    def run(self, output_format="table", stream=None):
+        self.simulate()
+        finish_time = None
+        if self.clock.now() < self.stop_at:
+            finish_time = self.clock.now()
+        write_status(self.hub.all_packages.value_iterator(), self.clock, self.trucks, output_format, stream,
+                     finish_time)
+
+    # Runs the simulation until every package is delivered or the stop time is reached without printing
+    # anything, so the results can be read from the hub, trucks, and clock afterward. If a profiler is set, it
+    # times the hot paths for the whole simulation and writes its results at the end. Same time complexity
+    # as run.
+    def simulate(self):
+        self.profiled(self.deliver_all)
+
+    # Continues a simulation which was stopped, or a fork of one, until every package is delivered or the new
+    # stop time is reached. The result is the same as if the simulation had not been stopped. O(n^3), the same
+    # as run, for the part of the day which is left.
+    def resume(self, stop_at):
+        self.stop_at = stop_at
+        self.profiled(self.deliver_remaining)
+
+    # Calls the given method on the simulation's hash table class, timing the hot paths while it runs if a
+    # profiler is set. O(1) plus the method.
+    def profiled(self, method):
+        with using_table_type(self.table_type):
+            if self.profiler is None:
+                method()
+            else:
+                self.profiler.start(profiled_targets())
+                try:
+                    method()
+                finally:
+                    self.profiler.stop()
+
+    # Sorts the packages, sends out the first batches, and advances time until the simulation ends. Sorting the
+    # packages is O(n) and the batches sent out each cost O(n^3), so this is O(n^3) like run.
+    def deliver_all(self):
+        self.hub.history = self.history
+        for package in self.hub.all_packages.value_iterator():
+            self.hub.record(package)
         self.hub.sort_packages()
-        self.hub.arrive(self.trucks[0])
-        self.hub.arrive(self.trucks[1])
+        for truck in self.trucks[:self.driver_count]:
+            self.hub.arrive(truck)
+        self.record_trucks()
+        self.deliver_remaining()
+
+    # Advances time until every package is delivered or the stop time is reached. Each batch loaded when a truck
+    # returns is O(n^3), so this is O(n^3) like run.
+    def deliver_remaining(self):
         while not self.is_finished() and self.clock.now() < self.stop_at:
-            self.advance_time()
-        print_status(self.hub.all_packages.value_iterator(), self.clock, self.trucks)
-        if self.clock.now() < self.stop_at:
-            print("Finished at " + str(self.clock.now()))
+            self.advance_time(self.increments_to_next_event())
+        if self.history is not None:
+            self.history.end(self.is_finished())
+
+    # Returns an independent copy of the simulation as it is now, which can be changed and resumed without
+    # affecting this one. The locations and distances are shared rather than copied. See checkpoint.Checkpoint.
+    # O(n) in the size of the simulation's changing state.
+    def fork(self):
+        from checkpoint import Checkpoint
+        return Checkpoint(self).fork()
+
+    # Returns the time the last package was delivered, or None if the simulation stopped first. O(n) where n
+    # is the number of trucks.
+    def finish_time(self):
+        if self.is_finished():
+            return self.clock.now()
+        return None
+
+    # Returns the total distance driven by all trucks in tenths of a mile. O(n) where n is the number of trucks.
+    def mile_tenths_driven(self):
+        mile_tenths = 0
+        for truck in self.trucks:
+            mile_tenths += truck.mile_tenths_driven
+        return mile_tenths
 
     # This method is O(n) where n is the number of trucks, but the drive method can trigger other
-    # more complex algorithms when the trucks arrive at their destinations.
-    def advance_time(self):
-        self.clock.advance_time()
+    # more complex algorithms when the trucks arrive at their destinations. Advancing several increments
+    # at once is only valid when no truck arrives and no event is due before the last of them, which is
+    # what increments_to_next_event guarantees.
+    def advance_time(self, increments=1):
+        self.clock.advance_time(increments)
         self.check_events()
         for truck in self.trucks:
-            truck.drive()
+            truck.drive(increments)
+        self.record_trucks()
+
+    # Records the distance driven by each truck and whether it is moving in the history, if one is being kept.
+    # O(n) where n is the number of trucks.
+    def record_trucks(self):
+        if self.history is not None:
+            for truck in self.trucks:
+                self.history.record_truck(truck, truck.is_moving())
+
+    # Returns how many increments can pass before the next truck arrival, scheduled event, or the stop
+    # time, whichever comes first. Trucks waiting at the hub do not limit the jump because nothing they
+    # could load changes until a truck arrives or an event happens, and those increments are never
+    # skipped. The increment in which an event happens is always advanced on its own, because the trucks
+    # drive it in the state the event leaves them in, such as broken down or repaired, which is the same
+    # as when every increment is advanced one at a time. Runs in O(n) where n is the number of trucks.
+    def increments_to_next_event(self):
+        increments = self.clock.increments_until(self.stop_at)
+        next_time = self.schedule.next_time()
+        if next_time is not None:
+            until_event = self.clock.increments_until(next_time)
+            increments = min(increments, until_event - 1 if until_event > 1 else until_event)
+        for truck in self.trucks:
+            if truck.is_moving():
+                increments = min(increments, truck.mile_tenths_to_destination)
+        return max(increments, 1)
 
     # Defines the finish condition for the simulation. Runs in O(n) worst case where n is the
     # number of trucks.
@@ -346,41 +1035,159 @@ class Simulator(object):
         finished = len(self.hub.remaining_packages) == 0
         if finished:
             for truck in self.trucks:
-                finished = len(truck.packages) == 0
+                finished = len(truck.manifest) == 0 and len(truck.reserved) == 0
                 if not finished:
                     break
         return finished
 
-    # This method initiates time-based events during the simulation. The loops that sometimes run
-    # during this method are O(n).
+    # This method applies the scheduled events once their time has been reached, in the order they were
+    # scheduled. Checking is O(1) when no event is due; each due event takes O(log n) to remove from the
+    # schedule plus the time to apply it.
     def check_events(self):
         now = self.clock.now()
-        # This is the delayed packages arriving to the hub at 9:05
-        if now == time(9, 5, 0):
-            for package in self.hub.delayed_packages.value_iterator():
-                package.status = "At Package Hub"
-            self.hub.delayed_packages = HashTable()
-        # This is the address correction for the undeliverable package
-        if now == time(10, 20, 0):
-            undeliverable_package = self.hub.all_packages[9]
-            for location in self.locations:
-                if location.address == "410 S State St":
-                    undeliverable_package.delivery_location = location
-                    undeliverable_package.status = "At Package Hub"
-                    self.hub.undeliverable_packages.remove(undeliverable_package.package_id)
-                    break
+        event = self.schedule.pop_due(now)
+        while event is not None:
+            event.apply(self)
+            event = self.schedule.pop_due(now)
+        if len(self.hub.newly_available) != 0:
+            packages = self.hub.newly_available
+            self.hub.newly_available = []
+            self.dispatch(packages)
+
+    # Offers packages which have become available during the day to the trucks on the road, in the order they
+    # were sorted. A package is left for the next truck at the hub if a truck which can take it is already
+    # waiting there, if it must be delivered with other packages, or if no truck on the road has room for it.
+    # Otherwise it is reserved for the truck which can deliver it with the least added distance while keeping
+    # every deadline, but only if that is less than leaving it for the next load from the hub would add; see
+    # Hub.hub_delivery_cost. O(k(n + t)) where k is the number of packages, n is the number of packages left to
+    # deliver, and t is the time for Hub.insertion_for on every truck.
+    def dispatch(self, packages):
+        hub = self.hub
+        for package in sorted(packages, key=hub.package_rank):
+            if package.package_id not in hub.remaining_packages or len(hub.groups[package.package_id]) != 1:
+                continue
+            trucks = [truck for truck in self.trucks[:self.driver_count]
+                      if not package.truck2_only or truck.truck_id == 2]
+            if len([truck for truck in trucks if truck.waiting]) != 0:
+                continue
+            limit = hub.hub_delivery_cost(package)
+            if limit == 0:
+                continue
+            best = None
+            best_truck = None
+            for truck in trucks:
+                if truck.broken_down or len(truck.manifest) + len(truck.reserved) >= truck.capacity:
+                    continue
+                insertion = hub.insertion_for(truck, package)
+                if insertion is not None and (best is None or insertion[0] < best[0]):
+                    best = insertion
+                    best_truck = truck
+            if best is not None and best[0] < limit:
+                hub.reserve(package, best_truck, best[1], best[2])
+
+    # Returns the truck with the given ID. Raises a KeyError if there is no such truck. O(n) where n is the
+    # number of trucks.
+    def find_truck(self, truck_id):
+        for truck in self.trucks:
+            if truck.truck_id == truck_id:
+                return truck
+        raise KeyError(truck_id)
+
+    # Changes the delivery location of a package. A package still at the hub is moved there, while a package
+    # already on a truck is moved to the stop for its new location on the same truck. The address of a package
+    # which has been delivered can no longer be changed. O(n) in the number of packages at its old location.
+    def correct_address(self, package, location):
+        if package.state == PackageStatus.DELIVERED:
+            return
+        if package.package_id in self.hub.reserved_packages:
+            self.hub.cancel_reservation(package)
+        if package.state == PackageStatus.ON_TRUCK:
+            manifest = self.find_truck(package.truck_id).manifest
+            manifest.remove(package)
+            package.delivery_location = location
+            manifest.add(package)
+            self.hub.record(package)
+        else:
+            self.hub.correct_address(package, location)
+
+    # Returns the packages, a clock, and the trucks as they were at the given time of day, along with the finish
+    # time, or None if the packages were not all delivered by then, exactly as a simulation stopped at that time
+    # would have left them. The packages and trucks are copies holding the recorded state, so the simulation
+    # itself is unchanged. Requires a history; see setup_simulator. O(n log m) where n is the number of packages
+    # and m is the number of changes recorded for each.
+    def status_at(self, time_of_day):
+        from copy import copy
+        if self.history is None:
+            raise ValueError("status_at requires a simulation run with a history")
+        tick = self.history.tick_at(time_of_day)
+        packages = []
+        for package in self.hub.all_packages.value_iterator():
+            snapshot = copy(package)
+            (snapshot.state, snapshot.truck_id, snapshot.delivery_location, snapshot.delivered_at,
+             snapshot.on_time) = self.history.package_at(package.package_id, tick)
+            packages.append(snapshot)
+        trucks = []
+        for truck in self.trucks:
+            snapshot = copy(truck)
+            snapshot.mile_tenths_driven = self.history.truck_mile_tenths_at(truck.truck_id, tick)
+            trucks.append(snapshot)
+        clock = Clock(self.clock.start_time, self.clock.increment)
+        clock.advance_time(tick)
+        finish_time = None
+        if self.history.finished and tick == self.history.end_tick and clock.now() < time_of_day:
+            finish_time = clock.now()
+        return packages, clock, trucks, finish_time
+
+    # Reports the state of the packages and trucks at the given time of day in the same way as run, from the
+    # history instead of simulating the day again. Same time complexity as status_at.
+    def report_at(self, time_of_day, output_format="table", stream=None):
+        packages, clock, trucks, finish_time = self.status_at(time_of_day)
+        write_status(packages, clock, trucks, output_format, stream, finish_time)
+
+
+class PackageStatus(IntEnum):
+    # The stages a package goes through during the day. A package starts at the hub, delayed, or undeliverable
+    # according to the package file.
+    AT_HUB = 0
+    DELAYED = 1
+    UNDELIVERABLE = 2
+    ON_TRUCK = 3
+    DELIVERED = 4
+
+
+# The status text used in the package file for each stage a package can start the day in.
+INITIAL_STATUSES = [("At Package Hub", PackageStatus.AT_HUB), ("Delayed", PackageStatus.DELAYED),
+                    ("Undeliverable", PackageStatus.UNDELIVERABLE)]
+
+
+# Converts the status text from the package file to a PackageStatus. Raises a ValueError for any other text. O(1)
+def parse_status(text):
+    for status_text, status in INITIAL_STATUSES:
+        if text == status_text:
+            return status
+    raise ValueError("invalid status " + repr(text))
 
 
 class Package(object):
-    # This class represents a package to be delivered. Initializes in O(1)
+    # This class represents a package to be delivered. Its status is stored as a PackageStatus with the truck it
+    # is on or the time it was delivered kept in separate fields, and the status text is only built when it is
+    # asked for. __slots__ keeps each package to a fixed set of fields with no per-instance dictionary, which
+    # matters when millions of packages are simulated. The status given may be a PackageStatus or the status text
+    # from the package file. Initializes in O(1)
+    __slots__ = ["package_id", "delivery_location", "weight", "deadline", "deadline_time", "state", "truck2_only",
+                 "deliver_with", "truck_id", "delivered_at", "on_time"]
+
     def __init__(self, package_id, delivery_location, weight, deadline, status, truck2_only, deliver_with):
         self.package_id = package_id
         self.delivery_location = delivery_location
         self.weight = weight
         self.deadline = deadline
-        self.status = status
+        self.state = status if isinstance(status, PackageStatus) else parse_status(status)
         self.truck2_only = truck2_only
         self.deliver_with = deliver_with
+        self.truck_id = None
+        self.delivered_at = None
+        self.on_time = None
         # This part assigns a datetime.time based on the deadline string
         if self.deadline == "EOD":
             self.deadline_time = time(17, 0, 0)
@@ -394,47 +1201,58 @@ class Package(object):
                 hour = 0
             self.deadline_time = time(hour, minute, 0)
 
+    # Returns the status of the package as text, such as "On Truck 2" or "Delivered at 10:32:20 (On time)". O(1)
+    @property
+    def status(self):
+        if self.state == PackageStatus.DELIVERED:
+            return "Delivered at " + str(self.delivered_at) + (" (On time)" if self.on_time else " (Late)")
+        if self.state == PackageStatus.ON_TRUCK:
+            return "On Truck " + str(self.truck_id)
+        return INITIAL_STATUSES[self.state][0]
+
+    # Records that the package was loaded onto the given truck. O(1)
+    def load(self, truck_id):
+        self.state = PackageStatus.ON_TRUCK
+        self.truck_id = truck_id
+
+    # Records that the package was delivered at the given time and whether that was before its deadline. O(1)
+    def deliver(self, delivered_at):
+        self.state = PackageStatus.DELIVERED
+        self.delivered_at = delivered_at
+        self.on_time = delivered_at <= self.deadline_time
+
     # This prints the package attributes and delivery status. O(1)
     def print_status(self):
-        pid = pad_spaces(str(self.package_id), 10, True)
-        location = self.delivery_location
-        address = location.address
-        city = location.city
-        zip_code = location.zip_code
-        location_str = pad_spaces(address + ", " + city + ", UT " + zip_code, 66)
-        weight = pad_spaces(str(self.weight) + " kg", 6, True)
-        deadline = pad_spaces(self.deadline, 8)
-        status = self.status
-        print(pid + " | " + location_str + " | " + weight + " | " + deadline + " | " + status)
-
-
-# Utility method to add spaces before or after a string. Runs in O(1)
-def pad_spaces(string, total_length, before=False):
-    spaces = " " * (total_length - len(string))
-    if before:
-        padded = spaces + string
-    else:
-        padded = string + spaces
-    return padded
+        print(package_row(self))
+
+
+# Returns the methods and functions timed by a Profiler attached to the simulator, as (class or module, name)
+# pairs. The module is looked up at run time so that module level functions are replaced where the simulator
+# calls them, even when this file is run as a script. The hash tables are timed in resize, which does the work
+# for both double and reserve. O(1)
+def profiled_targets():
+    module = sys.modules[__name__]
+    return [(Hub, "next_batch"), (Hub, "highest_priority_packages"), (module, "sort_by_location"),
+            (Hub, "fix_late_deliveries"), (Truck, "deliver"), (HashTable, "resize"), (OpenHashTable, "resize")]
 
 
-# Prints attributes and status of all packages and trucks. O(n)
+# Returns the key used to index a location by its address. Letter case and extra spaces are ignored so that
+# addresses typed slightly differently in the package file still match. O(1)
+def normalize_address(address, city, zip_code):
+    return (" ".join(address.split()).casefold(), " ".join(city.split()).casefold(), zip_code.strip())
+
+
+# Prints attributes and status of all packages and trucks as a table. O(n)
 def print_status(packages, clock, trucks):
-    print(" ")
-    print("Current time: " + str(clock.now()))
-    print("Package ID | " + pad_spaces("Delivery Location", 66) + " | Weight | Deadline | Status")
-    for package in packages:
-        package.print_status()
-    print(" ")
-    mile_tenths = 0
-    for truck in trucks:
-        mile_tenths += truck.mile_tenths_driven
-        print("Truck " + str(truck.truck_id) + " has driven " + str(truck.miles_driven()) + " miles")
-    print("Total miles driven: " + str(mile_tenths / 10.0))
+    write_status(packages, clock, trucks)
 
 
 class Truck(object):
-    # This class represents a delivery truck. Initializes in O(1)
+    # This class represents a delivery truck. Like Package, it uses __slots__ to avoid a per-instance dictionary.
+    # Initializes in O(1)
+    __slots__ = ["truck_id", "hub", "clock", "capacity", "mile_tenths_driven", "mile_tenths_to_destination",
+                 "manifest", "destination", "location", "waiting", "broken_down", "reserved"]
+
     def __init__(self, truck_id, hub, clock, capacity):
         self.truck_id = truck_id
         self.hub = hub
@@ -442,62 +1260,84 @@ class Truck(object):
         self.capacity = capacity
         self.mile_tenths_driven = 0
         self.mile_tenths_to_destination = 0
-        self.packages = []
+        self.manifest = Manifest()
         self.destination = None
         self.location = hub
         self.waiting = False
+        self.broken_down = False
+        # Packages waiting at the hub for this truck to pick them up. See Hub.reserve.
+        self.reserved = []
 
     # Loads a package onto the truck. The first package loaded determines the first destination. O(1)
     def add_package(self, package):
-        if len(self.packages) < self.capacity:
-            self.packages.append(package)
-            package.status = "On Truck " + str(self.truck_id)
-        if len(self.packages) == 1:
+        if len(self.manifest) < self.capacity:
+            self.manifest.add(package)
+            package.load(self.truck_id)
+            self.hub.record(package)
+        if len(self.manifest) == 1:
             self.set_destination()
             self.waiting = False
 
-    # Updates the truck's mileage and distance to the current destination. Time complexity of the method
-    # is normally O(1) but the arrive method can trigger delivery or a new batch of packages to be loaded,
-    # both of which are more complex algorithms. See comments on those methods for a more in-depth discussion
-    # of their time complexities.
-    def drive(self):
+    # Updates the truck's mileage and distance to the current destination. The truck covers a tenth of a mile
+    # per increment, and the simulator never advances more increments than remain to the destination. Time
+    # complexity of the method is normally O(1) but the arrive method can trigger delivery or a new batch of
+    # packages to be loaded, both of which are more complex algorithms. See comments on those methods for a
+    # more in-depth discussion of their time complexities. A truck which has broken down does nothing until it is
+    # repaired.
+    def drive(self, increments=1):
+        if self.broken_down:
+            return
         if self.waiting:
             self.hub.arrive(self)
         elif self.mile_tenths_to_destination > 0:
-            self.mile_tenths_driven += 1
-            self.mile_tenths_to_destination -= 1
+            self.mile_tenths_driven += increments
+            self.mile_tenths_to_destination -= increments
             if self.mile_tenths_to_destination == 0:
                 self.location = self.destination
                 self.destination.arrive(self)
 
-    # Delivers packages matching the address of the current location and replaces the list of packages
-    # on the truck with the remaining packages after delivery is complete. This method always runs in O(n).
+    # Delivers the packages for the current location, which the manifest keeps together, so only those packages
+    # are visited. Runs in O(k) where k is the number of packages delivered.
     def deliver(self):
-        remaining_packages = []
-        for package in self.packages:
-            if package.delivery_location == self.location:
-                if self.clock.now() <= package.deadline_time:
-                    on_time = " (On time)"
-                else:
-                    on_time = " (Late)"
-                package.status = "Delivered at " + str(self.clock.now()) + on_time
-            else:
-                remaining_packages.append(package)
-        self.packages = remaining_packages
+        now = self.clock.now()
+        for package in self.manifest.unload(self.location):
+            package.deliver(now)
+            self.hub.record(package)
         self.set_destination()
 
+    # Returns the packages on the truck in the order they will be delivered. O(n)
+    @property
+    def packages(self):
+        return list(self.manifest)
+
     # Sets the location of the next destination and the number of miles to reach it. O(1)
     def set_destination(self):
-        if len(self.packages) == 0:
+        if len(self.manifest) == 0:
             self.destination = self.hub
         else:
-            self.destination = self.packages[0].delivery_location
-        self.mile_tenths_to_destination = int(10 * self.location.distance_to(self.destination))
+            self.destination = self.manifest.next_stop()
+        self.mile_tenths_to_destination = self.location.tenths_to(self.destination)
+
+    # Loads the packages reserved for the truck when it stops at the hub part way through its route, and carries
+    # on to its next stop. O(n) in the number of packages reserved.
+    def pick_up(self):
+        self.manifest.unload(self.hub)
+        for package in self.reserved:
+            self.manifest.add(package)
+            package.load(self.truck_id)
+            self.hub.record(package)
+        self.reserved = []
+        self.waiting = False
+        self.set_destination()
 
     # Commands a truck to wait at the hub when no deliverable packages are available. O(1)
     def wait_at_hub(self):
         self.waiting = True
 
+    # Returns True if the truck is on its way to a destination, covering a tenth of a mile per increment. O(1)
+    def is_moving(self):
+        return not self.waiting and not self.broken_down and self.mile_tenths_to_destination > 0
+
     # Converts truck mileage into miles. The mileage on the trucks is tracked using integers representing
     # tenths of a mile driven because of the greater precision inherent to integer math over floating point
     # math. It is more accurate to make calculations with integers and convert to floating point only when
@@ -506,82 +1346,307 @@ class Truck(object):
         return self.mile_tenths_driven / 10.0
 
 
-# Utility method for converting a csv file into a table, represented by a list of lists where each inner
-# list is a row of the csv file. Runs in O(n).
-def read_csv(file_path):
+# Opens a text file for reading, decompressing it on the fly if it starts with the gzip signature, so that
+# compressed and uncompressed files can be given interchangeably. O(1)
+def open_text(file_path):
+    import gzip
+    with open(file_path, "rb") as file:
+        signature = file.read(2)
+    if signature == b"\x1f\x8b":
+        return gzip.open(file_path, "rt", newline="")
+    return open(file_path, newline="")
+
+
+class Manifest(object):
+    # This class holds the packages on a truck as an ordered sequence of stops with a bucket of packages for each
+    # stop, so that delivering at a stop only touches the packages for that stop and the stops can be reordered
+    # without moving any packages. The stops are in the order their first package was loaded. Initializes in O(1)
+    def __init__(self):
+        self.stops = deque()
+        self.buckets = new_table()
+        self.len = 0
+
+    # Allows len() function to take this object as an argument. Returns the number of packages. O(1)
+    def __len__(self):
+        return self.len
+
+    # Allows the packages to be iterated in delivery order. O(n)
+    def __iter__(self):
+        for location in self.stops:
+            yield from self.buckets[location.location_id]
+
+    # Adds a package to the bucket for its delivery location, adding that location as the last stop if no other
+    # package is going there. O(1)
+    def add(self, package):
+        location = package.delivery_location
+        if location.location_id in self.buckets:
+            self.buckets[location.location_id].append(package)
+        else:
+            self.buckets.add(location.location_id, [package])
+            self.stops.append(location)
+        self.len += 1
+
+    # Removes the stop for the given location and returns its packages, or an empty list if there are none.
+    # O(1) when the location is the next stop, which is where the truck always goes, otherwise O(n) in the
+    # number of stops.
+    def unload(self, location):
+        packages = self.buckets.pop(location.location_id)
+        if packages is None:
+            return []
+        if self.stops[0] is location:
+            self.stops.popleft()
+        else:
+            self.stops.remove(location)
+        self.len -= len(packages)
+        return packages
+
+    # Takes a package off the truck before it is delivered, removing its stop if no other package is going there.
+    # O(n) in the number of packages at its stop, plus the number of stops if the stop is removed.
+    def remove(self, package):
+        location = package.delivery_location
+        packages = self.buckets[location.location_id]
+        packages.remove(package)
+        if len(packages) == 0:
+            self.buckets.remove(location.location_id)
+            self.stops.remove(location)
+        self.len -= 1
+
+    # Adds a stop with no packages yet at the given position in the order of stops, unless the location is
+    # already a stop. Packages for it can be added later with add. O(n) in the number of stops.
+    def add_stop(self, location, position):
+        if location.location_id not in self.buckets:
+            self.buckets.add(location.location_id, [])
+            self.stops.insert(position, location)
+
+    # Removes the stop for the given location if no packages are going there. O(n) in the number of stops.
+    def remove_stop(self, location):
+        if location.location_id in self.buckets and len(self.buckets[location.location_id]) == 0:
+            self.buckets.remove(location.location_id)
+            self.stops.remove(location)
+
+    # Returns the location of the next stop. O(1)
+    def next_stop(self):
+        return self.stops[0]
+
+    # Changes the order of the stops to the given order of locations, which must be the same locations as the
+    # current stops. The packages stay in their buckets. O(n) in the number of stops.
+    def reorder(self, locations):
+        if len(locations) != len(self.stops):
+            raise ValueError("Expected " + str(len(self.stops)) + " stops but got " + str(len(locations)))
+        for location in locations:
+            if location.location_id not in self.buckets:
+                raise ValueError("No packages on the truck are going to " + location.address)
+        self.stops = deque(locations)
+
+
+# Utility method for reading a csv file one row at a time. Each row is yielded with its line number in the file
+# for error messages, and only one row is held in memory at a time. O(n) to read the whole file.
+def stream_csv(file_path):
     import csv
-    table = []
-    with open(file_path) as file:
+    with open_text(file_path) as file:
         reader = csv.reader(file)
         for row in reader:
-            table.append(row)
-    return table
-
-
-# Instantiates the Location objects by reading their attributes and the distance table from a csv file.
-# Runs in O(n^2)
-def setup_locations(packages, clock):
-    raw_table = read_csv("locations.csv")
-    distance_table = []
+            yield reader.line_num, row
+
+
+# Reads the location table from a csv file, returning a list of (address, city, zip code) tuples and a
+# DistanceMatrix in tenths of a mile. The csv file only holds the lower triangle of the table, which is expanded
+# into the full symmetric matrix once every row has been read, since the number of locations is not known before
+# then. Runs in O(n^2)
+def read_location_table(file_path):
+    from array import array
+    rows = []
+    row_distances = []
+    for line_number, row in stream_csv(file_path):
+        if len(row) < 4:
+            raise ValueError(file_path + " line " + str(line_number) + ": expected an address, city, zip code, "
+                             "and distances but found " + str(len(row)) + " columns")
+        distances = array("i")
+        j = 3
+        try:
+            while j < len(row) and row[j] != "":
+                distances.append(round(10 * float(row[j])))
+                j += 1
+        except ValueError:
+            raise ValueError(file_path + " line " + str(line_number) + ": invalid distance " + repr(row[j]))
+        rows.append((row[0], row[1], row[2]))
+        row_distances.append(distances)
+    distance_table = DistanceMatrix(len(rows))
+    for i in range(len(rows)):
+        for j in range(min(len(row_distances[i]), len(rows))):
+            distance_table.set(i, j, row_distances[i][j])
+    return rows, distance_table
+
+
+# Returns the location rows and distance matrix for a csv file from its binary cache, rebuilding the cache from
+# the csv file first if it is missing or out of date. O(n) when the cache is valid, otherwise O(n^2)
+def load_location_table(file_path, use_cache=True):
+    import location_cache
+    if use_cache:
+        cached = location_cache.read_cache(file_path)
+        if cached is not None:
+            return cached
+    rows, distance_table = read_location_table(file_path)
+    if use_cache:
+        location_cache.write_cache(file_path, rows, distance_table)
+    return rows, distance_table
+
+
+# Instantiates the Location objects from the location table, which is loaded from its binary cache when possible.
+# A table already returned by load_location_table can be given instead, in which case only the Location objects
+# are created and the distance matrix is shared. The first location is the hub, and each location is also added
+# to the hub's address index. O(n) when the cache is valid or the table is given, otherwise O(n^2) to read the
+# csv file.
+def setup_locations(packages, clock, file_path=DEFAULT_LOCATIONS_PATH, use_cache=True, location_table=None):
+    if location_table is None:
+        location_table = load_location_table(file_path, use_cache)
+    rows, distance_table = location_table
     locations = []
-    for i in range(len(raw_table)):
-        address = raw_table[i][0]
-        city = raw_table[i][1]
-        zip_code = raw_table[i][2]
+    for i in range(len(rows)):
+        address, city, zip_code = rows[i]
         if i == 0:
             locations.append(Hub(i, address, city, zip_code, distance_table, packages, clock))
         else:
             locations.append(Location(i, address, city, zip_code, distance_table))
-        distances = []
-        j = 3
-        while j < len(raw_table[i]) and raw_table[i][j] != "":
-            distances.append(float(raw_table[i][j]))
-            j += 1
-        distance_table.append(distances)
+        locations[0].index_location(locations[i])
     return locations
 
 
-# Instantiates the Package objects by reading their attributes from a csv file, then adds the packages
-# to a HashTable serving as the master list of Packages. Runs in O(n^2)
-def setup_packages(packages, locations):
-    raw_table = read_csv("packages.csv")
-    # O(n) loop
-    for i in range(len(raw_table)):
-        package_id = int(raw_table[i][0])
-        address = raw_table[i][1]
-        city = raw_table[i][2]
-        zip_code = raw_table[i][3]
-        deadline = raw_table[i][4]
-        weight = int(raw_table[i][5])
-        status = raw_table[i][6]
-        truck2_only = raw_table[i][7] == "Truck 2 Only"
+# Instantiates a Package object from one row of the package file. The first eight columns are the package ID,
+# address, city, zip code, deadline, weight, status, and special instructions, and any further non-empty
+# columns are the IDs of packages it must be delivered with. Raises a ValueError naming the line if the row is
+# malformed. The delivery location is looked up in the hub's address index and is None if there is no match.
+# Runs in O(1)
+def parse_package_row(row, line_number, hub):
+    if len(row) < 8:
+        raise ValueError("line " + str(line_number) + ": expected at least 8 columns but found " + str(len(row)))
+    try:
+        package_id = int(row[0])
+        weight = int(row[5])
         deliver_with = []
         j = 8
-        while j < len(raw_table[i]) and raw_table[i][j] != "":
-            deliver_with.append(int(raw_table[i][j]))
+        while j < len(row) and row[j] != "":
+            deliver_with.append(int(row[j]))
             j += 1
-        # O(n) loop to assign the correct instantiated Location object to the package
-        for location in locations:
-            if location.address == address and location.city == city and location.zip_code == zip_code:
-                package = Package(package_id, location, weight, deadline, status, truck2_only, deliver_with)
-                packages.add(package_id, package)
-                break
-
-
-# Instantiates the Simulator object and all of its dependencies. Runs in O(n^2)
-def setup_simulator(stop_at):
-    # Per requirements, the day starts at 8 AM. A timedelta increment of 20 seconds is used because
-    # the trucks travel 18 mph, which is 0.3 miles/minute, or 0.1 mile every 20 seconds, and all the
-    # distances are rounded to the nearest tenth of a mile.
-    clock = Clock(time(8, 0, 0), timedelta(0, 20))
-    packages = HashTable()
-    locations = setup_locations(packages, clock)
+        location = hub.find_location(row[1], row[2], row[3])
+        return Package(package_id, location, weight, row[4], row[6], row[7] == "Truck 2 Only", deliver_with)
+    except ValueError as error:
+        raise ValueError("line " + str(line_number) + ": " + str(error))
+
+
+# Instantiates the Package objects by reading their attributes from a csv file one row at a time, then adds
+# the packages to a HashTable serving as the master list of Packages. The file may be gzip compressed. The
+# packages are kept in a list while the file is read and the master list is sized for all of them before they
+# are added, so it never resizes while it is filled. Each package's delivery
+# location is looked up in the hub's address index. If any address is not on the network, a ValueError listing
+# every unmatched row is raised after the whole file has been checked, and likewise if a package must be delivered
+# with a package which is not in the file. Runs in O(n)
+def setup_packages(packages, locations, file_path=DEFAULT_PACKAGES_PATH):
     hub = locations[0]
-    setup_packages(packages, locations)
-    trucks = []
-    for i in range(1, 4):
-        trucks.append(Truck(i, hub, clock, 16))
-    return Simulator(hub, trucks, clock, locations, stop_at)
+    loaded = []
+    unmatched = []
+    grouped = []
+    # O(n) loop
+    for line_number, row in stream_csv(file_path):
+        try:
+            package = parse_package_row(row, line_number, hub)
+        except ValueError as error:
+            raise ValueError(file_path + " " + str(error))
+        if package.delivery_location is None:
+            unmatched.append("line " + str(line_number) + ", package " + str(package.package_id) + ": " + row[1] +
+                             ", " + row[2] + ", " + row[3])
+        else:
+            loaded.append(package)
+        if len(package.deliver_with) != 0:
+            grouped.append((line_number, package))
+    if len(unmatched) != 0:
+        raise ValueError(file_path + ": no location matches the delivery address of " + "; ".join(unmatched))
+    packages.reserve(len(packages) + len(loaded))
+    for package in loaded:
+        packages.add(package.package_id, package)
+    missing = []
+    for line_number, package in grouped:
+        for other_package_id in package.deliver_with:
+            if other_package_id not in packages:
+                missing.append("line " + str(line_number) + ", package " + str(package.package_id) +
+                               ": package " + str(other_package_id))
+    if len(missing) != 0:
+        raise ValueError(file_path + ": packages must be delivered with packages not in the file, " +
+                         "; ".join(missing))
+
+
+# Returns the shipped event file if the given package file is the shipped one, otherwise None for a day without
+# events. O(1)
+def default_events_path(packages_path):
+    if os.path.realpath(packages_path) == os.path.realpath(DEFAULT_PACKAGES_PATH):
+        return DEFAULT_EVENTS_PATH
+    return None
+
+
+# Instantiates the Simulator object and all of its dependencies. Setting improve_routes runs the route
+# improvement stage on every batch loaded at the hub, and table_type selects the hash table class used
+# throughout the simulation, such as containers.OpenHashTable. A profiler from the instrumentation module can be
+# given to time the simulation's hot paths. The location, package, and event files can be given as paths, and
+# events_path can be None to simulate a day without events. By default the shipped events are only used with the
+# shipped packages. The fleet and the trucks' average speed in miles per
+# hour can be changed to simulate different scenarios, and delay_release and address_correction move every
+# package release and every address correction in the event file to the given time. A location table already
+# returned by load_location_table can be given to avoid loading it again. Setting record_history keeps a history
+# of the day so that Simulator.status_at can report any time up to stop_at after a single run. A cluster_count
+# above 0 turns on fleet mode for large fleets, where each truck loads from one cluster of nearby locations; see
+# Hub.assign_cluster. Setting dynamic_dispatch lets the trucks on the road pick up packages which become available
+# during the day; see Simulator.dispatch. Runs in O(n^2), or O(n) when the location table is given.
+def setup_simulator(stop_at, improve_routes=False, table_type=None, truck_count=3, capacity=16, driver_count=2,
+                    speed=18, delay_release=None, address_correction=None, location_table=None,
+                    profiler=None, locations_path=DEFAULT_LOCATIONS_PATH, packages_path=DEFAULT_PACKAGES_PATH,
+                    events_path=DEFAULT_EVENTS, record_history=False, cluster_count=0,
+                    dynamic_dispatch=False):
+    with using_table_type(table_type):
+        # Per requirements, the day starts at 8 AM. A timedelta increment of 20 seconds is used because
+        # the trucks travel 18 mph, which is 0.3 miles/minute, or 0.1 mile every 20 seconds, and all the
+        # distances are rounded to the nearest tenth of a mile. Other speeds change the time per tenth of a mile.
+        clock = Clock(time(8, 0, 0), timedelta(seconds=360 / speed))
+        packages = new_table()
+        locations = setup_locations(packages, clock, locations_path, location_table=location_table)
+        hub = locations[0]
+        hub.improve_routes = improve_routes
+        hub.cluster_count = cluster_count
+        hub.dynamic_dispatch = dynamic_dispatch
+        setup_packages(packages, locations, packages_path)
+        trucks = []
+        for i in range(1, truck_count + 1):
+            trucks.append(Truck(i, hub, clock, capacity))
+        events = []
+        if events_path == DEFAULT_EVENTS:
+            events_path = default_events_path(packages_path)
+        if events_path is not None:
+            events = read_events(events_path, hub.find_location)
+            validate_events(events, packages, truck_count)
+        for event in events:
+            if isinstance(event, ReleasePackages) and delay_release is not None:
+                event.time = delay_release
+            elif isinstance(event, CorrectAddress) and address_correction is not None:
+                event.time = address_correction
+        simulator = Simulator(hub, trucks, clock, locations, stop_at, driver_count, events)
+        simulator.profiler = profiler
+        simulator.table_type = table_type
+        if record_history:
+            simulator.history = DeliveryHistory(clock)
+        return simulator
+
+
+# The day simulated for the interactive menu, which is only run once. See recorded_day.
+menu_day = None
+
+
+# Returns the day simulated up to the latest time the menu accepts with a history, running it the first time it is
+# needed. Every report the menu shows afterward is read from the history. O(n^3) the first time, O(1) after.
+def recorded_day():
+    global menu_day
+    if menu_day is None:
+        menu_day = setup_simulator(time(23, 59, 0), record_history=True)
+        menu_day.simulate()
+    return menu_day
 
 
 # Displays main menu and prompts for user selection. Runs in O(1), may lead to method call that runs in O(n^3).
@@ -595,11 +1660,11 @@ def display_menu():
 
 
 # Executes main menu selection of the user or prompts to try again. O(1) base method but may call a method
-# that runs in O(n^3).
+# that runs in O(n^3) the first time, and O(n log n) after that.
 def parse_menu_selection(user_input):
     run_again = True
     if user_input == "1":
-        setup_simulator(time(17, 0, 0)).run()
+        recorded_day().report_at(time(17, 0, 0))
     elif user_input == "2":
         select_time()
     elif user_input == "3":
@@ -616,7 +1681,8 @@ def select_time():
     parse_time_selection(input("Time: "))
 
 
-# Runs simulation until time specified by the user or prompts to try again. Method called runs in O(n^3).
+# Reports the state of the day at the time specified by the user or prompts to try again. Method called runs in
+# O(n^3) the first time a report is shown, and O(n log n) after that.
 def parse_time_selection(user_input):
     try:
         colon_pos = user_input.find(":")
@@ -624,7 +1690,7 @@ def parse_time_selection(user_input):
         minute = int(user_input[colon_pos + 1:])
         if hour < 8 or hour > 23 or minute < 0 or minute > 59:
             raise ValueError
-        setup_simulator(time(hour, minute, 0)).run()
+        recorded_day().report_at(time(hour, minute, 0))
     except ValueError:
         print("Sorry, that selection is invalid.")
         select_time()
@@ -637,7 +1703,141 @@ def program_running():
     return run_again
 
 
+# Simulates one day for a package file and writes the final state in the given format to the stream, standard
+# output by default. A location table already returned by load_location_table can be given so that many days can
+# be run without loading the locations again. Any other keyword arguments are passed to setup_simulator. Returns
+# the Simulator so its results can be inspected. Same time complexity as Simulator.run.
+def run_day(packages_path=DEFAULT_PACKAGES_PATH, locations_path=DEFAULT_LOCATIONS_PATH, stop_at=time(17, 0, 0),
+            output_format="table", stream=None, location_table=None, **options):
+    if location_table is None:
+        location_table = load_location_table(locations_path)
+    simulator = setup_simulator(stop_at, location_table=location_table, packages_path=packages_path, **options)
+    simulator.run(output_format, stream)
+    return simulator
+
+
+# Simulates one day for each package file, loading the locations only once. Each report is written to a file in
+# output_directory named after its package file, or to standard output if no directory is given. A package file
+# which cannot be loaded is reported on standard error and skipped without leaving a partial report. Returns the
+# number of package files which failed. O(n) days, each with the time complexity of Simulator.run.
+def run_days(packages_paths, locations_path=DEFAULT_LOCATIONS_PATH, output_directory=None, output_format="table",
+             **options):
+    location_table = load_location_table(locations_path)
+    failures = 0
+    for packages_path in packages_paths:
+        path = None
+        try:
+            if output_directory is None:
+                if output_format == "table" and len(packages_paths) > 1:
+                    print("==> " + packages_path + " <==")
+                run_day(packages_path, locations_path, output_format=output_format, location_table=location_table,
+                        **options)
+            else:
+                path = report_path(output_directory, packages_path, output_format)
+                with open(path, "w", newline="") as stream:
+                    run_day(packages_path, locations_path, output_format=output_format, stream=stream,
+                            location_table=location_table, **options)
+        except (OSError, ValueError) as error:
+            print(packages_path + ": " + str(error), file=sys.stderr)
+            failures += 1
+            if path is not None and os.path.exists(path):
+                os.remove(path)
+    return failures
+
+
+# Returns the path of the report for a package file in the output directory, such as out/monday.jsonl for
+# manifests/monday.csv.gz. O(1)
+def report_path(output_directory, packages_path, output_format):
+    name = os.path.basename(packages_path)
+    for extension in [".gz", ".csv"]:
+        if name.endswith(extension):
+            name = name[:-len(extension)]
+    return os.path.join(output_directory, name + "." + ("txt" if output_format == "table" else output_format))
+
+
+# Converts text in the format HH:MM or HH:MM:SS to a time. Raises a ValueError if the text is not a valid time.
+# O(1)
+def parse_clock_time(text):
+    parts = text.split(":")
+    if len(parts) < 2 or len(parts) > 3:
+        raise ValueError("invalid time " + repr(text) + ", expected HH:MM")
+    return time(*[int(part) for part in parts])
+
+
+# Converts command line text to an integer greater than zero. Raises a ValueError for anything else, which argparse
+# reports as a usage error. O(1)
+def positive_int(text):
+    value = int(text)
+    if value <= 0:
+        raise ValueError("expected a number greater than zero, got " + repr(text))
+    return value
+
+
+# Converts command line text to an integer of zero or more. Raises a ValueError for anything else. O(1)
+def non_negative_int(text):
+    value = int(text)
+    if value < 0:
+        raise ValueError("expected a number of zero or more, got " + repr(text))
+    return value
+
+
+# Converts command line text to a number greater than zero. Raises a ValueError for anything else, including
+# infinity and NaN. O(1)
+def positive_float(text):
+    value = float(text)
+    if not 0 < value < float("inf"):
+        raise ValueError("expected a number greater than zero, got " + repr(text))
+    return value
+
+
+# Parses the command line options for a batch run. O(n) in the number of arguments.
+def parse_arguments(args):
+    import argparse
+    from reporting import FORMATS
+    parser = argparse.ArgumentParser(prog="python -m wgups",
+                                     description="Simulate a day of deliveries for each package file. Run without "
+                                                 "arguments for the interactive menu.")
+    parser.add_argument("packages", nargs="*", default=[DEFAULT_PACKAGES_PATH],
+                        help="package files, optionally gzip compressed (default: the shipped packages.csv)")
+    parser.add_argument("--locations", default=DEFAULT_LOCATIONS_PATH, help="location and distance file")
+    parser.add_argument("--events", default=DEFAULT_EVENTS,
+                        help="scheduled events file, or 'none' for a day without events (default: the shipped "
+                             "events.csv for the shipped packages.csv, and no events for other package files)")
+    parser.add_argument("--stop", type=parse_clock_time, default=time(17, 0, 0), help="stop time as HH:MM")
+    parser.add_argument("--trucks", type=positive_int, default=3, help="number of trucks")
+    parser.add_argument("--drivers", type=positive_int, default=2, help="number of drivers, and so of trucks sent out")
+    parser.add_argument("--capacity", type=positive_int, default=16, help="packages each truck can carry")
+    parser.add_argument("--speed", type=positive_float, default=18, help="average truck speed in miles per hour")
+    parser.add_argument("--improve-routes", action="store_true", help="shorten each route with 2-opt and Or-opt")
+    parser.add_argument("--clusters", type=non_negative_int, default=0,
+                        help="split the locations into this many clusters and load each truck from one of them")
+    parser.add_argument("--dynamic-dispatch", action="store_true",
+                        help="let trucks on the road return to the hub for packages that arrive during the day")
+    parser.add_argument("--format", choices=FORMATS, default="table", help="report format")
+    parser.add_argument("--output-dir", help="write one report per package file to this directory")
+    return parser.parse_args(args)
+
+
+# Runs the interactive menu when no arguments are given, otherwise simulates the package files named on the command
+# line. Returns the exit status. Same time complexity as run_days.
+def main(args=None):
+    if args is None:
+        args = sys.argv[1:]
+    if len(args) == 0:
+        while program_running():
+            pass
+        return 0
+    options = parse_arguments(args)
+    if options.output_dir is not None:
+        os.makedirs(options.output_dir, exist_ok=True)
+    failures = run_days(options.packages, options.locations, options.output_dir, options.format,
+                        stop_at=options.stop, truck_count=options.trucks, driver_count=options.drivers,
+                        capacity=options.capacity, speed=options.speed, improve_routes=options.improve_routes,
+                        events_path=None if options.events == "none" else options.events,
+                        cluster_count=options.clusters, dynamic_dispatch=options.dynamic_dispatch)
+    return 1 if failures != 0 else 0
+
+
 # Program launcher, time complexity O(n^3) matching the largest time complexity of the whole program.
 if __name__ == "__main__":
-    while program_running():
-        pass
+    sys.exit(main())
@@ -0,0 +1,138 @@
+from wgups import setup_simulator, load_location_table, PackageStatus, DEFAULT_LOCATIONS_PATH
+from datetime import time
+from multiprocessing import Pool
+import os
+import random
+
+
+# Runs many variants of a day's deliveries across a pool of worker processes and summarizes the results. The
+# location table is loaded once per worker by init_worker and shared by every simulation that worker runs. When
+# the table comes from the memory-mapped binary cache, the workers also share its pages through the operating
+# system, so the distance matrix is held in memory only once however many workers there are.
+
+
+# Set in each worker process by init_worker.
+worker_location_table = None
+
+
+class Scenario(object):
+    # This class describes one variant of the day to simulate. The trucks' average speed is drawn from a normal
+    # distribution around speed with a standard deviation of speed_noise, using seed so the draw can be repeated.
+    # delay_release and address_correction move the package releases and address corrections from the event file,
+    # which are kept at their scheduled times when None. Initializes in O(1)
+    def __init__(self, name, truck_count=3, driver_count=2, capacity=16, delay_release=None,
+                 address_correction=None, speed=18.0, speed_noise=0.0, seed=None,
+                 improve_routes=False, stop_at=time(17, 0, 0)):
+        self.name = name
+        self.truck_count = truck_count
+        self.driver_count = driver_count
+        self.capacity = capacity
+        self.delay_release = delay_release
+        self.address_correction = address_correction
+        self.speed = speed
+        self.speed_noise = speed_noise
+        self.seed = seed
+        self.improve_routes = improve_routes
+        self.stop_at = stop_at
+
+    # Returns the average speed of the trucks for this variant, never less than one mile per hour. O(1)
+    def draw_speed(self):
+        if self.speed_noise == 0:
+            return self.speed
+        return max(1.0, random.Random(self.seed).gauss(self.speed, self.speed_noise))
+
+
+class ScenarioResult(object):
+    # This class holds the outcome of simulating one scenario. finish_time is None if the packages were not all
+    # delivered by the scenario's stop time. Initializes in O(1)
+    def __init__(self, name, speed, miles, late_count, undelivered_count, finish_time):
+        self.name = name
+        self.speed = speed
+        self.miles = miles
+        self.late_count = late_count
+        self.undelivered_count = undelivered_count
+        self.finish_time = finish_time
+
+
+# Loads the location table once when a worker process starts. O(n) when the binary cache is valid.
+def init_worker(locations_path):
+    global worker_location_table
+    worker_location_table = load_location_table(locations_path)
+
+
+# Simulates one scenario in a worker process and returns its result. Same time complexity as Simulator.run.
+def run_scenario(scenario):
+    speed = scenario.draw_speed()
+    simulator = setup_simulator(scenario.stop_at, scenario.improve_routes, truck_count=scenario.truck_count,
+                                capacity=scenario.capacity, driver_count=scenario.driver_count, speed=speed,
+                                delay_release=scenario.delay_release,
+                                address_correction=scenario.address_correction,
+                                location_table=worker_location_table)
+    simulator.simulate()
+    late_count = 0
+    undelivered_count = 0
+    for package in simulator.hub.all_packages.value_iterator():
+        if package.state != PackageStatus.DELIVERED:
+            undelivered_count += 1
+        elif not package.on_time:
+            late_count += 1
+    return ScenarioResult(scenario.name, speed, simulator.mile_tenths_driven() / 10.0, late_count,
+                          undelivered_count, simulator.finish_time())
+
+
+# Simulates every scenario across a pool of worker processes, one per CPU unless a number is given, and returns
+# the results in the same order as the scenarios. O(n) scenarios, each with the time complexity of
+# Simulator.run, divided among the workers.
+def run_scenarios(scenarios, processes=None, locations_path=DEFAULT_LOCATIONS_PATH):
+    # Building the cache before starting the workers means they all map the same file instead of each
+    # parsing the csv file and racing to write the cache.
+    load_location_table(locations_path)
+    if processes is None:
+        processes = os.cpu_count() or 1
+    with Pool(processes, init_worker, (locations_path,)) as pool:
+        return pool.map(run_scenario, scenarios, chunksize=max(1, len(scenarios) // (4 * processes)))
+
+
+# Returns a list of scenarios which differ from the given one only in the seed used to draw the trucks' speed.
+# O(n)
+def monte_carlo(scenario, runs, seed=0):
+    from copy import copy
+    scenarios = []
+    for i in range(runs):
+        variant = copy(scenario)
+        variant.name = scenario.name + " #" + str(i + 1)
+        variant.seed = seed + i
+        scenarios.append(variant)
+    return scenarios
+
+
+# Returns the lines of a summary of the results: how many runs finished, the range and average of the miles
+# driven, how many packages were late or undelivered in total, and the latest finish time. O(n)
+def summarize(results):
+    miles = [result.miles for result in results]
+    finish_times = [result.finish_time for result in results if result.finish_time is not None]
+    lines = ["Runs: " + str(len(results)) + " (" + str(len(finish_times)) + " finished)"]
+    if len(results) != 0:
+        lines.append("Miles driven: min " + str(min(miles)) + ", mean " + str(round(sum(miles) / len(miles), 1)) +
+                     ", max " + str(max(miles)))
+    lines.append("Late packages: " + str(sum([result.late_count for result in results])) +
+                 " in " + str(len([result for result in results if result.late_count != 0])) + " runs")
+    lines.append("Undelivered packages: " + str(sum([result.undelivered_count for result in results])))
+    if len(finish_times) != 0:
+        lines.append("Latest finish: " + str(max(finish_times)))
+    return lines
+
+
+# Simulates the given number of days with random speeds around 18 mph and prints the summary, for example
+# python whatif.py 1000 2.0
+def main(args):
+    runs = int(args[0]) if len(args) > 0 else 100
+    speed_noise = float(args[1]) if len(args) > 1 else 1.5
+    results = run_scenarios(monte_carlo(Scenario("Speed noise", speed_noise=speed_noise), runs))
+    for line in summarize(results):
+        print(line)
+
+
+if __name__ == "__main__":
+    import sys
+    main(sys.argv[1:])